@@ -0,0 +1,119 @@
+r"""
+Check of the shortcut of meth:`MessageDirective.run_cell`: in the ``table`` layout, a
+comment that does not look like it has some reST structure only gets its inline
+markup parsed. A message with comments that start (or look like they start) all
+sorts of reST constructs is documented twice, with the shortcut and with the nested
+parsing forced for every comment, and the two doctrees must be the same.
+
+Run it from the root of the repository (requires Sphinx), it exits with 1 on failure::
+
+    python benchmarks/cell_parsing.py
+"""
+import difflib
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from sphinx_rosmsgs import message_directive
+
+COMMENTS = [
+    "Plain text",
+    "Plain text, with *emphasis*, ``literal`` and a `link <http://example.com>`_",
+    "A comment on\nmore lines",
+    "Value in m/s. Between 0 and 1: clamped",
+    "1. arabic",
+    "(1) first item",
+    "a) letter item",
+    "A. Einstein was a physicist",
+    "i. roman",
+    "MCM. roman",
+    "#) auto",
+    "#. auto",
+    "(#) auto",
+    "- bullet",
+    "* bullet",
+    "• bullet",
+    "-v  verbose flag",
+    "--rate  rate in Hz",
+    "/V  DOS option",
+    "__ http://example.com",
+    ".. _target:",
+    ".. note:: a note",
+    ":field: value",
+    "| line block",
+    ">>> 1 + 1",
+    "Literal::\n\n    block",
+    "Title\n-----\n\nText",
+    "----",
+    "=====  =====\nA      B\n=====  =====",
+    "+---+\n| A |\n+---+",
+    "Term\n    definition",
+    "First paragraph\n\nSecond paragraph",
+    "``literal`` first",
+    "**strong** first",
+    "*emphasis* first",
+    "`interpreted` first",
+    "_underscore first",
+    "2 items",
+    "x: meaning",
+    "C3 is 3. Really",
+]
+
+
+def write_package(root):
+    package = root / "cell_msgs"
+    (package / "msg").mkdir(parents=True)
+    (package / "package.xml").write_text("<package><name>cell_msgs</name></package>")
+    lines = []
+    for i, comment in enumerate(COMMENTS):
+        lines += [f"# {line}".rstrip() for line in comment.splitlines()]
+        lines.append(f"int32 field_{i}")
+    (package / "msg" / "Cells.msg").write_text("\n".join(lines) + "\n")
+    return package
+
+
+def build(root, package, name):
+    source = root / name
+    source.mkdir()
+    (source / "conf.py").write_text(
+        f"extensions = ['sphinx_rosmsgs']\nrosmsg_path_root = [{str(package)!r}]\n")
+    (source / "index.rst").write_text(
+        "Cells\n=====\n\n.. ros_message:: cell_msgs/Cells\n   :layout: table\n")
+    with docutils_namespace():
+        app = Sphinx(str(source), str(source), str(source / "_build"), str(source / "_doctrees"),
+                     "html", status=None, warning=None, freshenv=True)
+        app.build()
+        return "".join(child.pformat() for child in app.env.get_doctree("index").children)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        package = write_package(root)
+        shortcut = build(root, package, "shortcut")
+        structure = message_directive.RST_STRUCTURE
+        message_directive.RST_STRUCTURE = re.compile("")
+        try:
+            nested = build(root, package, "nested")
+        finally:
+            message_directive.RST_STRUCTURE = structure
+
+    plain = [comment for comment in COMMENTS if not any(map(structure.search, comment.splitlines()))]
+    print(f"comments:         {len(COMMENTS)}")
+    print(f"inline shortcut:  {len(plain)}")
+    if shortcut != nested:
+        sys.stdout.writelines(difflib.unified_diff(
+            nested.splitlines(True), shortcut.splitlines(True), "nested", "shortcut"))
+        print("FAILED")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
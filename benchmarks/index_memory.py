@@ -0,0 +1,74 @@
+r"""
+Memory benchmark for the message index. It compares the storage of 100k
+entries in the class:`MessageIndex` against the storage that was used before
+(two parallel dictionaries, with a ``pathlib.Path`` for each message).
+
+Run it from the root of the repository::
+
+    python benchmarks/index_memory.py [--entries 100000]
+"""
+import argparse
+import sys
+import os
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from sphinx_rosmsgs.message_index import MessageIndex
+from sphinx_rosmsgs.message_indexer import MessageIndexer
+
+MessageIndexer.init_class()
+
+
+def synthetic_entries(count, per_package=50):
+    for i in range(count):
+        package = f"package_{i // per_package}"
+        msg_type = MessageIndexer.message_type_list[i % 3]
+        extension = MessageIndexer.extension_list[i % 3]
+        folder = extension[1:]
+        yield f"{package}/Message{i}", f"/workspace/src/{package}/{folder}/Message{i}{extension}", msg_type
+
+
+def measure(build, entries):
+    tracemalloc.start()
+    container = build(entries)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, size
+
+
+def build_dicts(entries):
+    index, type_index = {}, {}
+    for name, path, msg_type in entries:
+        index[name] = Path(path)
+        type_index[name] = msg_type
+    return index, type_index
+
+
+def build_message_index(entries):
+    index = MessageIndex(MessageIndexer.message_type_list, MessageIndexer.extension_list)
+    for name, path, msg_type in entries:
+        index.add(name, Path(path), msg_type)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=100000)
+    args = parser.parse_args()
+
+    entries = list(synthetic_entries(args.entries))
+    _, dicts_size = measure(build_dicts, entries)
+    index, index_size = measure(build_message_index, entries)
+
+    name, path, msg_type = entries[-1]
+    assert index.get_path(name) == Path(path) and index.get_type(name) == msg_type
+
+    print(f"entries:            {args.entries}")
+    print(f"dict + Path:        {dicts_size / 2**20:8.2f} MiB")
+    print(f"MessageIndex:       {index_size / 2**20:8.2f} MiB")
+    print(f"ratio:              {dicts_size / index_size:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
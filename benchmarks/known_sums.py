@@ -0,0 +1,143 @@
+r"""
+Check of the class:`MessageHasher` against the MD5 sums computed by ROS 1 for a set
+of real messages (copied with their comments, trailing comments included), and of the
+class:`MessageLayout` against their serialized sizes. The messages are written in a
+temporary workspace and indexed by a class:`MessageIndexer`.
+
+Run it from the root of the repository, it exits with 1 on failure::
+
+    python benchmarks/known_sums.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from sphinx_rosmsgs.message_indexer import MessageIndexer
+from sphinx_rosmsgs.message_layout import WireSize
+
+MESSAGES = {
+    "std_msgs/msg/Header.msg": """\
+# Standard metadata for higher-level stamped data types.
+# This is generally used to communicate timestamped data
+# in a particular coordinate frame.
+#
+# sequence ID: consecutively increasing ID
+uint32 seq
+#Two-integer timestamp that is expressed as:
+# * stamp.sec: seconds (stamp_secs) since epoch (in Python the variable is called 'secs')
+# * stamp.nsec: nanoseconds since stamp_secs (in Python the variable is called 'nsecs')
+# time-handling sugar is provided by the client library
+time stamp
+#Frame this data is associated with
+string frame_id
+""",
+    "geometry_msgs/msg/Point.msg": """\
+# This contains the position of a point in free space
+float64 x
+float64 y
+float64 z
+""",
+    "geometry_msgs/msg/Quaternion.msg": """\
+# This represents an orientation in free space in quaternion form.
+
+float64 x
+float64 y
+float64 z
+float64 w
+""",
+    "geometry_msgs/msg/Pose.msg": """\
+# A representation of pose in free space, composed of position and orientation.
+Point position
+Quaternion orientation
+""",
+    "geometry_msgs/msg/PoseStamped.msg": """\
+# A Pose with reference coordinate frame and timestamp
+Header header
+Pose pose
+""",
+    "std_srvs/srv/SetBool.srv": """\
+bool data # e.g. for hardware enabling / disabling
+---
+bool success   # indicate successful run of triggered service
+string message # informational, e.g. for error messages
+""",
+    "rosgraph_msgs/msg/Log.msg": """\
+##
+## Severity level constants
+##
+byte DEBUG=1 #debug level
+byte INFO=2  #general level
+byte WARN=4  #warning level
+byte ERROR=8 #error level
+byte FATAL=16 #fatal/critical level
+##
+## Fields
+##
+Header header
+byte level
+string name # name of the node
+string msg # message
+string file # file the message came from
+string function # function the message came from
+uint32 line # line the message came from
+string[] topics # topic names that the node publishes
+""",
+}
+
+MD5SUMS = {
+    "std_msgs/Header": "2176decaecbce78abc3b96ef049fabed",
+    "geometry_msgs/Point": "4a842b65f413084dc2b10fb484ea7f17",
+    "geometry_msgs/Quaternion": "a779879fadf0160734f906b8c19c7004",
+    "geometry_msgs/Pose": "e45d45a5a1ce597b249e23fb30fc871f",
+    "geometry_msgs/PoseStamped": "d3812c3cbc69362b77dc0b19b345f8f5",
+    "std_srvs/SetBool": "09fb03525b03e7ea1fd3992bafd87e16",
+    "rosgraph_msgs/Log": "acffd30cd6b6de30f120938c17c593fb",
+}
+
+# Header: seq (4) + stamp (8) + frame_id (4 + variable); Log: 16 + level (1) + 4 strings
+# (4 + variable each) + line (4) + topics (4 + variable)
+WIRE_SIZES = {
+    "std_msgs/Header": [WireSize(16, None)],
+    "geometry_msgs/Point": [WireSize(24, 24)],
+    "geometry_msgs/Pose": [WireSize(56, 56)],
+    "geometry_msgs/PoseStamped": [WireSize(72, None)],
+    "std_srvs/SetBool": [WireSize(1, 1), WireSize(5, None)],
+    "rosgraph_msgs/Log": [WireSize(41, None)],
+}
+
+
+def write_workspace(root):
+    for relative, content in MESSAGES.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        package = path.parent.parent
+        (package / "package.xml").write_text(f"<package><name>{package.name}</name></package>")
+
+
+def main():
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        write_workspace(root)
+        indexer = MessageIndexer([str(root)])
+        for name, expected in MD5SUMS.items():
+            md5sum = indexer.md5sum(name)
+            print(f"{name:<28} {md5sum}")
+            if md5sum != expected:
+                failures.append(f"{name}: MD5 sum {md5sum}, expected {expected}")
+        for name, expected in WIRE_SIZES.items():
+            sizes = indexer.wire_size(name)
+            print(f"{name:<28} {', '.join(str(size) for size in sizes)}")
+            if [(size.min_size, size.max_size) for size in sizes] != [(size.min_size, size.max_size) for size in expected]:
+                failures.append(f"{name}: wire size {sizes}, expected {expected}")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    print("FAILED" if failures else "OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
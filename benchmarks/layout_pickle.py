@@ -0,0 +1,82 @@
+r"""
+Benchmark of the ``:layout:`` option of the ``ros_message`` directive. A message
+with many fields and constants is documented with the ``description`` layout and
+with the ``table`` layout, in two separate Sphinx builds. For each layout the
+benchmark reports the number of nodes and the pickle size of the doctree, and the
+time spent writing the HTML output.
+
+Run it from the root of the repository (requires Sphinx)::
+
+    python benchmarks/layout_pickle.py [--fields 500]
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+
+
+def write_package(root, fields):
+    package = root / "bench_msgs"
+    (package / "msg").mkdir(parents=True)
+    (package / "package.xml").write_text("<package><name>bench_msgs</name></package>")
+    lines = []
+    for i in range(fields):
+        lines.append(f"# Description of the constant ``C{i}``")
+        lines.append(f"int32 C{i}={i}")
+        lines.append(f"# Description of the field ``field_{i}``, with *markup*")
+        lines.append(f"float64[3] field_{i}")
+    (package / "msg" / "Large.msg").write_text("\n".join(lines) + "\n")
+    return package
+
+
+def build(root, package, layout):
+    source = root / layout
+    source.mkdir()
+    (source / "conf.py").write_text(
+        f"extensions = ['sphinx_rosmsgs']\nrosmsg_path_root = [{str(package)!r}]\n")
+    (source / "index.rst").write_text(
+        f"Large\n=====\n\n.. ros_message:: bench_msgs/Large\n   :layout: {layout}\n")
+
+    timings = {}
+    with docutils_namespace():
+        app = Sphinx(str(source), str(source), str(source / "_build"), str(source / "_doctrees"),
+                     "html", status=None, warning=sys.stderr, freshenv=True)
+        app.connect("write-started", lambda *_: timings.setdefault("start", time.perf_counter()))
+        app.build()
+        write_time = time.perf_counter() - timings["start"]
+        doctree = app.env.get_doctree("index")
+
+    return {
+        "nodes": sum(1 for _ in doctree.findall()),
+        "pickle": len(pickle.dumps(doctree, pickle.HIGHEST_PROTOCOL)),
+        "write": write_time,
+        "html": (source / "_build" / "index.html").stat().st_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--fields", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        package = write_package(root, args.fields)
+        results = {layout: build(root, package, layout) for layout in ("description", "table")}
+
+    print(f"definitions: {2 * args.fields}")
+    print(f"{'layout':<12} {'nodes':>8} {'pickle (KiB)':>13} {'html (KiB)':>11} {'write (s)':>10}")
+    for layout, result in results.items():
+        print(f"{layout:<12} {result['nodes']:>8} {result['pickle'] / 1024:>13.1f} "
+              f"{result['html'] / 1024:>11.1f} {result['write']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
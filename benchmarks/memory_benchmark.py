@@ -0,0 +1,177 @@
+r"""
+Memory benchmark and regression gate. On a synthetic workspace, it records with
+``tracemalloc`` the peak and the retained memory, per 1k interfaces, of:
+
+ * ``construction``: the construction of a class:`MessageIndexer` (discovery and indexing)
+ * ``parse_all``: the parsing of all the interfaces with meth:`MessageIndexer.parse_all`
+ * ``render``: a Sphinx build of a page with a ``ros_message`` directive per interface
+
+The results are compared with the baseline stored in ``memory_baseline.json``: the
+run fails (exit code 1) when a value exceeds the baseline by more than the tolerance.
+Values depend on the Python version, so update the baseline (``--update``) when
+changing it, or after an intended change of the memory footprint.
+
+Run it from the root of the repository (requires Sphinx, as the extension does)::
+
+    python benchmarks/memory_benchmark.py [--interfaces 2000] [--rendered 200]
+                                          [--tolerance 0.25] [--update]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from sphinx.application import Sphinx
+from sphinx.util.docutils import docutils_namespace
+from sphinx_rosmsgs.message_indexer import MessageIndexer
+
+BASELINE = Path(__file__).parent / "memory_baseline.json"
+METRICS = ("peak", "retained")
+
+
+def write_workspace(root, interfaces, per_package=50):
+    r"""
+    A workspace with messages, services and actions, each with comments, constants,
+    builtin fields, arrays and embedded messages of the same package. All the files
+    are different, so the content deduplication of the indexer does not hide the cost.
+    """
+    names = []
+    for i in range(interfaces):
+        package = f"bench_{i // per_package}_msgs"
+        package_path = root / package
+        if i % per_package == 0:
+            package_path.mkdir()
+            (package_path / "package.xml").write_text(f"<package><name>{package}</name></package>")
+        kind = ("msg", "srv", "action")[0 if i % per_package == 0 else i % 3]
+        block = [
+            f"# Block of the interface {i}, with *markup*",
+            f"int32 LIMIT_{i}={i}",
+            f"string LABEL=interface {i}",
+            f"# The header",
+            f"Header header",
+            f"float64[3] values_{i}",
+            f"uint8[] data",
+            f"string name  # name of the interface {i}",
+        ]
+        if i % per_package:
+            block.append(f"Interface{i - i % per_package} embedded")
+        blocks = {"msg": 1, "srv": 2, "action": 3}[kind]
+        content = "\n---\n".join("\n".join(block) for _ in range(blocks))
+        (package_path / kind).mkdir(exist_ok=True)
+        (package_path / kind / f"Interface{i}.{kind}").write_text(content + "\n")
+        names.append(f"{package}/Interface{i}")
+    std_msgs = root / "std_msgs"
+    (std_msgs / "msg").mkdir(parents=True)
+    (std_msgs / "package.xml").write_text("<package><name>std_msgs</name></package>")
+    (std_msgs / "msg" / "Header.msg").write_text("uint32 seq\ntime stamp\nstring frame_id\n")
+    return names
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    result = function(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"peak": peak, "retained": retained}
+
+
+def render(root, names):
+    source = root / "doc"
+    source.mkdir()
+    (source / "conf.py").write_text(
+        f"extensions = ['sphinx_rosmsgs']\nrosmsg_path_root = [{str(root / 'ws')!r}]\n")
+    directives = "".join(f".. ros_message:: {name}\n\n" for name in names)
+    (source / "index.rst").write_text(f"Benchmark\n=========\n\n{directives}")
+    with docutils_namespace():
+        app = Sphinx(str(source), str(source), str(source / "_build"), str(source / "_doctrees"),
+                     "html", status=None, warning=sys.stderr, freshenv=True)
+        _, memory = measure(app.build)
+    return memory
+
+
+def per_1k(memory, count):
+    return {metric: round(memory[metric] / 2**10 * 1000 / count, 1) for metric in METRICS}
+
+
+def run(interfaces, rendered):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "ws").mkdir()
+        names = write_workspace(root / "ws", interfaces)
+        indexer, construction = measure(MessageIndexer, [str(root / "ws")])
+        _, parse_all = measure(indexer.parse_all)
+        count = len(indexer.index)
+        results = {
+            "construction": per_1k(construction, count),
+            "parse_all": per_1k(parse_all, count),
+        }
+        del indexer
+        results["render"] = per_1k(render(root, names[:rendered]), rendered)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    r"""
+    Compares the results with the baseline. Stages and metrics missing in the
+    baseline are not checked.
+
+    :return: the list of the regressions, as messages
+    :rtype: list
+    """
+    regressions = []
+    for stage, memory in results.items():
+        for metric in METRICS:
+            reference = baseline.get(stage, {}).get(metric)
+            if reference is None:
+                continue
+            if memory[metric] > reference * (1 + tolerance):
+                regressions.append(f"{stage} {metric}: {memory[metric]:.1f} KiB per 1k interfaces, "
+                                   f"baseline {reference:.1f} KiB ({memory[metric] / reference - 1:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--interfaces", type=int, default=2000)
+    parser.add_argument("--rendered", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative increase over the baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--update", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    results = run(args.interfaces, args.rendered)
+    print(f"{'stage':<14} {'peak (KiB/1k)':>14} {'retained (KiB/1k)':>18}")
+    for stage, memory in results.items():
+        print(f"{stage:<14} {memory['peak']:>14.1f} {memory['retained']:>18.1f}")
+
+    if args.update:
+        baseline = {"python": platform.python_version(), "interfaces": args.interfaces,
+                    "rendered": args.rendered, "results": results}
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"no baseline in {args.baseline}, run with --update to create it", file=sys.stderr)
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("python", "").rsplit(".", 1)[0] != platform.python_version().rsplit(".", 1)[0]:
+        print(f"warning: the baseline was recorded with Python {baseline.get('python')}", file=sys.stderr)
+    if (baseline.get("interfaces"), baseline.get("rendered")) != (args.interfaces, args.rendered):
+        print(f"warning: the baseline was recorded with --interfaces {baseline.get('interfaces')} "
+              f"--rendered {baseline.get('rendered')}, fixed costs weigh differently", file=sys.stderr)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+r"""
+Stress test of the class:`MessageIndexer` shared between threads. On a synthetic
+workspace, many reader threads parse, hash and look up messages while a writer thread
+rewrites, deletes and recreates files of a package (applied with meth:`update_path`)
+and registrar threads build and register new global indexers. The switch interval of
+the interpreter is lowered, to make the interleavings more likely.
+
+It checks that:
+
+ * no thread gets an unexpected exception
+ * each message is parsed once, even when all the threads request it at the same time
+ * the parsed messages of the stable packages are the same objects for all the threads
+ * meth:`MessageIndexer.retrieve_global` always returns a fully built indexer, while
+   new ones are built and registered
+ * the index is consistent with the disk at the end
+
+Run it from the root of the repository, it exits with 1 on failure::
+
+    python benchmarks/thread_stress.py [--threads 16] [--seconds 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(__file__, "../..")))
+from sphinx_rosmsgs.message_indexer import MessageIndexer
+
+
+def write_workspace(root, packages=10, per_package=30):
+    names = []
+    for p in range(packages):
+        package = root / f"stress_{p}_msgs"
+        (package / "msg").mkdir(parents=True)
+        (package / "package.xml").write_text(f"<package><name>stress_{p}_msgs</name></package>")
+        for i in range(per_package):
+            embedded = f"Message{i - 1} previous\n" if i else ""
+            (package / "msg" / f"Message{i}.msg").write_text(
+                f"# Message {i} of the package {p}\nint32 ID={i}\nfloat64[3] values\n{embedded}")
+            names.append(f"stress_{p}_msgs/Message{i}")
+    churn = root / "churn_msgs"
+    (churn / "msg").mkdir(parents=True)
+    (churn / "package.xml").write_text("<package><name>churn_msgs</name></package>")
+    for i in range(10):
+        (churn / "msg" / f"Churn{i}.msg").write_text(f"int32 value_{i}\n")
+    return names, churn
+
+
+class Stress:
+
+    def __init__(self, root, names, churn, seconds):
+        self.root = root
+        self.names = names
+        self.churn = churn
+        self.deadline = time.monotonic() + seconds
+        self.errors = []
+        self.operations = 0
+        self.lock = threading.Lock()
+
+    def running(self):
+        return time.monotonic() < self.deadline and not self.errors
+
+    def guard(self, function):
+        def wrapper(*args):
+            try:
+                function(*args)
+            except BaseException:
+                with self.lock:
+                    self.errors.append(f"{threading.current_thread().name}:\n{traceback.format_exc()}")
+        return wrapper
+
+    def count(self, operations):
+        with self.lock:
+            self.operations += operations
+
+    def cold_start(self, indexer, threads):
+        r"""
+        All the threads parse all the stable messages at the same time, on a cold cache
+        """
+        barrier = threading.Barrier(threads)
+        results = [None] * threads
+
+        def parse_all(position):
+            barrier.wait()
+            names = list(self.names)
+            random.Random(position).shuffle(names)
+            results[position] = {name: indexer.parse(name) for name in names}
+
+        workers = [threading.Thread(target=self.guard(parse_all), args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if self.errors:
+            return
+        stats = indexer.dedup_stats
+        if stats["parsed"] + stats["shared"] != len(self.names):
+            self.errors.append(f"messages parsed more than once: {stats} for {len(self.names)} names")
+        for result in results[1:]:
+            if any(result[name] is not results[0][name] for name in self.names):
+                self.errors.append("threads got different parsed objects for the same message")
+                break
+
+    def retrieve_built(self):
+        r"""
+        The global indexer, checking that it is completely built: all the stable
+        messages are indexed
+        """
+        indexer = MessageIndexer.retrieve_global()
+        if not isinstance(indexer, MessageIndexer):
+            raise AssertionError(f"the global indexer is {indexer!r}")
+        missing = [name for name in (self.names[0], self.names[-1]) if name not in indexer.index]
+        if missing or len(indexer.index) < len(self.names):
+            raise AssertionError(f"the global indexer is not completely built: {len(indexer.index)} messages")
+        return indexer
+
+    def reader(self, seed):
+        generator = random.Random(seed)
+        operations = 0
+        while self.running():
+            indexer = self.retrieve_built()
+            name = generator.choice(self.names)
+            parsed = indexer.parse(name)
+            if parsed is None or parsed.name != name:
+                raise AssertionError(f"wrong parse for `{name}`: {parsed}")
+            assert indexer.get_type(name) == "message"
+            assert indexer.get_path(name).name == f"{name.rpartition('/')[2]}.msg"
+            indexer.md5sum(name)
+            indexer.wire_size(name)
+            churn = f"churn_msgs/Churn{generator.randrange(10)}"
+            try:
+                indexer.parse(churn)
+            except (KeyError, FileNotFoundError):
+                pass
+            sum(1 for _ in indexer.index)
+            operations += 1
+        self.count(operations)
+
+    def writer(self, seed):
+        generator = random.Random(seed)
+        operations = 0
+        while self.running():
+            indexer = self.retrieve_built()
+            path = self.churn / "msg" / f"Churn{generator.randrange(10)}.msg"
+            if path.exists() and generator.random() < 0.3:
+                path.unlink()
+            else:
+                path.write_text(f"int32 value\nstring label  # {generator.random()}\n")
+            indexer.update_path(path)
+            operations += 1
+        self.count(operations)
+
+    def registrar(self, seed):
+        generator = random.Random(seed)
+        operations = 0
+        while self.running():
+            if generator.random() < 0.5:
+                registered = MessageIndexer.register_global([str(self.root)])
+            else:
+                registered = MessageIndexer.register_global(None, MessageIndexer([str(self.root)]))
+            self.retrieve_built()
+            registered.parse(generator.choice(self.names))
+            operations += 1
+        self.count(operations)
+
+    def check_final(self, indexer):
+        r"""
+        The last registered indexer may have been built while a file was changing: 
+        the package is rescanned, as the watcher does when events are lost.
+        """
+        indexer.update_tree(self.churn)
+        on_disk = {f"churn_msgs/{path.stem}" for path in (self.churn / "msg").glob("*.msg")}
+        indexed = {name for name in indexer.index if name.startswith("churn_msgs/")}
+        if on_disk != indexed:
+            self.errors.append(f"index differs from disk: {sorted(on_disk ^ indexed)}")
+        for name in on_disk:
+            if indexer.parse(name).name != name:
+                self.errors.append(f"wrong parse for `{name}` at the end")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    sys.setswitchinterval(1e-6)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        names, churn = write_workspace(root)
+        stress = Stress(root, names, churn, args.seconds)
+        indexer = MessageIndexer.register_global([str(root)])
+        stress.cold_start(indexer, args.threads)
+
+        threads = [threading.Thread(target=stress.guard(stress.reader), args=(i,), name=f"reader-{i}")
+                   for i in range(args.threads)]
+        threads.append(threading.Thread(target=stress.guard(stress.writer), args=(-1,), name="writer"))
+        threads += [threading.Thread(target=stress.guard(stress.registrar), args=(-2 - i,), name=f"registrar-{i}")
+                    for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not stress.errors:
+            stress.check_final(MessageIndexer.retrieve_global())
+
+    print(f"threads:    {len(threads)}")
+    print(f"operations: {stress.operations}")
+    for error in stress.errors:
+        print(error, file=sys.stderr)
+    print("FAILED" if stress.errors else "OK")
+    return 1 if stress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,4 +11,5 @@ setup(name='sphinx_rosmsgs',
       author_email='info@ragni.me',
       license='MIT',
       packages=['sphinx_rosmsgs', 'sphinx_rosmsgs.file_parser'],
+      package_data={'sphinx_rosmsgs': ['static/*.js']},
       zip_safe=False)
\ No newline at end of file
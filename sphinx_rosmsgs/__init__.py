@@ -1,6 +1,15 @@
+import os
+import re
 from sphinx_rosmsgs.__version__ import __version__
-from sphinx_rosmsgs.message_directive import MessageDirective
+from sphinx_rosmsgs.message_directive import MessageDirective, on_missing_reference
 from sphinx_rosmsgs.message_indexer import MessageIndexer
+from sphinx_rosmsgs.message_watcher import MessageWatcher
+from sphinx_rosmsgs import message_search
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_DIRECTIVE = re.compile(r'^\s*\.\.\s+ros_message::\s*(?P<name>\S+)\s*$', re.MULTILINE)
 
 
 def on_config_inited(app, *args):
@@ -9,15 +18,75 @@ def on_config_inited(app, *args):
     a global message indexer accordingly to user configuration.
 
     The global indexer will be used inside the directive to parse the
-    actual files.
+    actual files. The configuration can be a list of paths or a single
+    string, with paths separated by ``os.pathsep`` (as ``AMENT_PREFIX_PATH``).
+    The packages discovered below workspaces are cached in the doctree 
+    directory.
+
+    When ``rosmsg_watch`` is enabled and the process already built the
+    same configuration (e.g. a live documentation server), the indexer 
+    of the previous build is kept and only the filesystem changes are 
+    applied to it. The watcher is created at the second build of the
+    process: servers that run each build in a new process (as 
+    sphinx-autobuild does) never reuse it, and do not pay for it.
 
     :param app: sphinx app, for configuration
     :param args: unused arguments
     """
     paths = app.config["rosmsg_path_root"]
     if isinstance(paths, str):
-        paths = [paths]
-    MessageIndexer.register_global(paths)
+        paths = paths.split(os.pathsep)
+    discovery_cache = os.path.join(app.doctreedir, "rosmsgs_discovery.json")
+    if not app.config["rosmsg_watch"]:
+        MessageIndexer.register_global(paths, MessageIndexer(paths, discovery_cache))
+        return
+
+    watcher = MessageWatcher.retrieve_global()
+    if watcher is not None and watcher.indexer.path_list == paths:
+        try:
+            stale = watcher.poll()
+        except RuntimeError as error:
+            logger.warning(f"[rosmsgs] {error}")
+        else:
+            if stale:
+                logger.info(f"[rosmsgs] stale messages: {', '.join(sorted(stale))}")
+        MessageIndexer.register_global(paths, watcher.indexer)
+        return
+    try:
+        built = MessageIndexer.retrieve_global().path_list == paths
+    except KeyError:
+        built = False
+    indexer = MessageIndexer.register_global(paths, MessageIndexer(paths, discovery_cache))
+    if built:
+        MessageWatcher.register_global(indexer)
+
+
+def on_source_read(app, docname, source):
+    r"""
+    The document is scanned for ``ros_message`` directives: the documented messages
+    are kept for the directives (the ``:embedded: document`` option links to them 
+    instead of rendering them again). When ``rosmsg_prefetch`` is enabled, the 
+    referenced messages start to be parsed in background by the global indexer, 
+    before the directives run.
+
+    :param app: sphinx app, for configuration
+    :param docname: unused, the name of the document
+    :param source: a list with the source of the document as unique element
+    """
+    names = [match.group("name") for match in MESSAGE_DIRECTIVE.finditer(source[0])]
+    app.env.temp_data["rosmsgs_documented"] = set(names)
+    if names and app.config["rosmsg_prefetch"]:
+        MessageIndexer.retrieve_global().prefetch(names, app.config["rosmsg_prefetch_workers"])
+
+
+def on_build_finished(app, *args):
+    r"""
+    Stops the prefetch threads of the global indexer, if any.
+
+    :param app: unused, sphinx app
+    :param args: unused arguments
+    """
+    MessageIndexer.retrieve_global().shutdown_prefetch()
 
 
 def setup(app):
@@ -29,8 +98,19 @@ def setup(app):
     :rtype: dict
     """
     app.add_config_value('rosmsg_path_root', [], 'env')
+    app.add_config_value('rosmsg_watch', False, 'env')
+    app.add_config_value('rosmsg_prefetch', False, '')
+    app.add_config_value('rosmsg_prefetch_workers', 4, '')
+    app.add_config_value('rosmsg_search_index', False, 'html')
     app.add_directive("ros_message", MessageDirective)
     app.connect('config-inited', on_config_inited)
+    app.connect('source-read', on_source_read)
+    app.connect('build-finished', on_build_finished)
+    app.connect('builder-inited', message_search.on_builder_inited)
+    app.connect('env-purge-doc', message_search.on_env_purge_doc)
+    app.connect('env-merge-info', message_search.on_env_merge_info)
+    app.connect('build-finished', message_search.on_build_finished)
+    app.connect('missing-reference', on_missing_reference)
     return {
         'version': __version__,
     }
@@ -0,0 +1,246 @@
+import io
+import os
+import fnmatch
+import posixpath
+import tarfile
+import zipfile
+from pathlib import Path
+
+
+class ArchiveSource:
+    r"""
+    A ``.tar.gz`` (or any other tar compression), ``.zip`` or ``.whl`` archive containing
+    ROS packages. The archive is read in a single streaming pass: the member listing and
+    the content of the ``package.xml`` and interface files (which are small) are kept
+    in memory, nothing is extracted on disk.
+
+    Sources are cached by archive path and modification time (see meth:`open`), so an
+    archive is read again only when it changes.
+
+    :param path: the path of the archive
+    :param extension_list: the extensions of the files to read, besides ``package.xml``
+    """
+
+    archive_ext = (".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz", ".tar", ".zip", ".whl")
+    package_xml = "package.xml"
+    cache = {}
+
+    @classmethod
+    def is_archive(klass, path):
+        r"""
+        Check if a path is a supported archive, looking at its extension
+
+        :param path: the path to check
+        :return: true if the path is a supported archive
+        :rtype: bool
+        """
+        return str(path).lower().endswith(klass.archive_ext)
+
+    @classmethod
+    def open(klass, path, extension_list):
+        r"""
+        Returns the source of an archive, reading it only if it is not in the cache or
+        it has been modified.
+
+        :param path: the path of the archive
+        :param extension_list: the extensions of the files to read, besides ``package.xml``
+        :raise RuntimeError: if the archive cannot be read
+        :return: the source of the archive
+        :rtype: ArchiveSource
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        mtime = path.stat().st_mtime_ns
+        cached = klass.cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        source = klass(path, extension_list)
+        klass.cache[key] = (mtime, source)
+        return source
+
+    def __init__(self, path, extension_list):
+        self.path = Path(path)
+        self._extension_list = tuple(extension_list)
+        self._contents = {}
+        self._dirs = set()
+        try:
+            if zipfile.is_zipfile(self.path):
+                self._read_zip()
+            else:
+                self._read_tar()
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as e:
+            raise RuntimeError(f"Cannot read the archive `{self.path}`. Error: {e}")
+        for member in self._contents:
+            parent = posixpath.dirname(member)
+            while parent and parent not in self._dirs:
+                self._dirs.add(parent)
+                parent = posixpath.dirname(parent)
+
+    def _is_wanted(self, member):
+        file_name = posixpath.basename(member)
+        return file_name == self.package_xml or file_name.endswith(self._extension_list)
+
+    def _read_tar(self):
+        with tarfile.open(self.path, "r|*") as archive:
+            for member in archive:
+                name = posixpath.normpath(member.name)
+                if member.isfile() and self._is_wanted(name):
+                    self._contents[name] = archive.extractfile(member).read()
+
+    def _read_zip(self):
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                name = posixpath.normpath(info.filename)
+                if not info.is_dir() and self._is_wanted(name):
+                    self._contents[name] = archive.read(info)
+
+    def read_bytes(self, member):
+        r"""
+        The content of a member of the archive
+
+        :param member: the name of the member in the archive
+        :raise FileNotFoundError: if the member is not in the archive (or was not read)
+        :return: the content of the member
+        :rtype: bytes
+        """
+        try:
+            return self._contents[member]
+        except KeyError:
+            raise FileNotFoundError(f"`{member}` is not in the archive `{self.path}`")
+
+    def is_file(self, member):
+        return member in self._contents
+
+    def is_dir(self, member):
+        return member == "" or member in self._dirs
+
+    def files(self):
+        r"""
+        The names of the members that were read
+
+        :return: the names of ``package.xml`` and interface files in the archive
+        :rtype: list
+        """
+        return list(self._contents)
+
+    def packages(self):
+        r"""
+        The packages in the archive: all the directories with a ``package.xml``
+
+        :return: a list of paths of the package directories
+        :rtype: list
+        """
+        return [ArchivePath(self, posixpath.dirname(member)) for member in sorted(self._contents)
+                if posixpath.basename(member) == self.package_xml]
+
+
+class ArchivePath:
+    r"""
+    A path inside an class:`ArchiveSource`, that implements the subset of ``pathlib.Path``
+    used by the indexer and the parser (``/``, ``name``, ``stem``, ``suffix``, ``parent``,
+    ``exists``, ``glob``, ``open``, ``read_bytes``, ``stat``...). The string
+    representation is the path of the archive joined with the member name.
+
+    :param source: the source of the archive
+    :param member: the name of the member (``""`` is the root of the archive)
+    """
+
+    def __init__(self, source, member=""):
+        self.source = source
+        self.member = "" if member in ("", ".") else member
+
+    @property
+    def archive(self):
+        r"""
+        The path of the archive on disk
+
+        :rtype: pathlib.Path
+        """
+        return self.source.path
+
+    def __truediv__(self, name):
+        return ArchivePath(self.source, posixpath.join(self.member, name))
+
+    @property
+    def name(self):
+        return posixpath.basename(self.member)
+
+    @property
+    def suffix(self):
+        return posixpath.splitext(self.name)[1]
+
+    @property
+    def stem(self):
+        return posixpath.splitext(self.name)[0]
+
+    @property
+    def parent(self):
+        return ArchivePath(self.source, posixpath.dirname(self.member))
+
+    @property
+    def parents(self):
+        parents = []
+        member = self.member
+        while member:
+            member = posixpath.dirname(member)
+            parents.append(ArchivePath(self.source, member))
+        return parents
+
+    def resolve(self):
+        return self
+
+    def exists(self):
+        return self.source.is_file(self.member) or self.source.is_dir(self.member)
+
+    def stat(self):
+        r"""
+        The ``stat`` of the archive: members have no modification time on their own
+        """
+        return self.source.path.stat()
+
+    def glob(self, pattern):
+        r"""
+        Yields the files below the current directory matching a pattern. Only the
+        recursive patterns ``**/<name pattern>`` and plain name patterns are supported.
+
+        :param pattern: the pattern of the files
+        """
+        recursive = pattern.startswith("**/")
+        file_pattern = pattern[3:] if recursive else pattern
+        prefix = f"{self.member}/" if self.member else ""
+        for member in self.source.files():
+            if not member.startswith(prefix):
+                continue
+            relative = member[len(prefix):]
+            if not recursive and "/" in relative:
+                continue
+            if fnmatch.fnmatch(posixpath.basename(relative), file_pattern):
+                yield ArchivePath(self.source, member)
+
+    def read_bytes(self):
+        return self.source.read_bytes(self.member)
+
+    def open(self, mode="r"):
+        r"""
+        Open the member as a stream, in memory
+
+        :param mode: ``r`` for a text stream, ``rb`` for a binary stream
+        :return: a readable stream
+        """
+        content = io.BytesIO(self.read_bytes())
+        if "b" in mode:
+            return content
+        return io.TextIOWrapper(content)
+
+    def __eq__(self, other):
+        return (isinstance(other, ArchivePath) and self.source.path == other.source.path and
+                self.member == other.member)
+
+    def __hash__(self):
+        return hash((self.source.path, self.member))
+
+    def __str__(self):
+        return os.path.join(str(self.source.path), *self.member.split("/")) if self.member else str(self.source.path)
+
+    def __repr__(self):
+        return f"ArchivePath('{self}')"
@@ -1,3 +1,4 @@
+import copy
 from sphinx_rosmsgs.file_parser.comment_field import CommentField
 from sphinx_rosmsgs.file_parser.empty_line_field import EmptyLineField
 from sphinx_rosmsgs.file_parser.message_field import MessageField
@@ -24,7 +25,8 @@ class FileParser:
     the type coming from the message extension matches the one coming from the content.
 
     :param message_name: the message name in ROS terms
-    :param message_path: the path to the file to open for parsing
+    :param message_path: the path to the file to open for parsing, or a readable text stream
+                         (e.g. a member of an archive)
     :param message_type: the type of the message provided by the user
     """
 
@@ -37,13 +39,16 @@ class FileParser:
         self._blocks = [BlockParser(), BlockParser(), BlockParser()]
         self._current_block = 0
         self._parse_lock = False
+        self._unparsed = []
 
-    def parse(self):
+    def parse(self, content=None):
         r"""
         Actual parse routine. It will read the file and parse it, populating the content.
         Running parse will unlock the other properties of the current object. The actually
         parsing procedure runs only once, but returns self always.
 
+        :param content: the text of the message, if already read by the caller. When 
+                        given, the file is not opened.
         :return: the current file parser instance
         :rtype: FileParser
         :raise IOError: if the message file does not exists
@@ -51,10 +56,16 @@ class FileParser:
         if self._parse_lock:
             return
         self._parse_lock = True
-        with open(self._message_path, "r") as message_file:
-            self._content = message_file.read().splitlines()
-        for line in self._content:
+        if content is None and hasattr(self._message_path, "read"):
+            content = self._message_path.read()
+        if content is None:
+            with open(self._message_path, "r") as message_file:
+                content = message_file.read()
+        self._content = content.splitlines()
+        for line_number, line in enumerate(self._content, 1):
             curr_line = self._parse_line(line)
+            if isinstance(curr_line, EmptyLineField) and line.strip() and not line.strip().startswith("#"):
+                self._unparsed.append((line_number, line))
             if curr_line:
                 self._blocks[self._current_block].append(curr_line)
         return self
@@ -83,6 +94,22 @@ class FileParser:
             return
         return EmptyLineField.parse(line)
 
+    def share(self, message_name, message_path):
+        r"""
+        Returns a parser for another message with the same content of the current one.
+        The parsed blocks are shared with the current parser and are not parsed again,
+        only the name and the path are replaced.
+
+        :param message_name: the message name in ROS terms
+        :param message_path: the path of the file of the other message
+        :return: a file parser for the other message
+        :rtype: FileParser
+        """
+        shared = copy.copy(self)
+        shared._message_name = message_name
+        shared._message_path = message_path
+        return shared
+
     @property
     def name(self):
         r"""
@@ -164,4 +191,19 @@ class FileParser:
         ret = ["message", "service", "action"]
         return ret[self._current_block]
 
+    @property
+    def unparsed(self):
+        r"""
+        The lines that are not empty and are neither a comment, a definition nor a 
+        block separator. They do not appear in the blocks, thus everything computed from
+        the definitions (e.g. the MD5 sum) would be wrong if they were ignored.
+
+        :return: a list of ``(line number, line)`` tuples
+        :rtype: list
+        :raise RuntimeError: when parse has not run on the object
+        """
+        if not self._parse_lock:
+            raise RuntimeError("You must run parse on the file parser before accessing it")
+        return self._unparsed
+
             
\ No newline at end of file
@@ -25,13 +25,17 @@ class MessageField:
     The idea is to split all those part of the definition in order to create the single attributes. The parsing
     of this kind of string is made by a regular expression.
 
+    A trailing comment (e.g. ``bool data  # enable or disable``) is not part of the definition: it is appended
+    to the description of the field. The same holds for constants, except ``string`` constants: as in ROS, their
+    value is the whole rest of the line, ``#`` included.
+
     :param match: the match coming from the regular expression
     """
 
     # https://regex101.com/r/a2vqhn/1
-    #                          ---type---------------  ---is_list--------------------------          ---name---------------     ---is_equal------------------        
-    #                                                                ---list_size----------                                                      ---value---
-    PARSER = re.compile(r'^\s*(?P<type>[a-zA-Z0-9/_]+)(?P<is_list>\[(?P<list_size>[0-9]*)\]){0,1}\s*(?P<name>[a-zA-Z0-9/_]+)\s*(?P<is_equal>=\s*(?P<value>.*)){0,1}$')
+    #                          ---type---------------  ---is_list--------------------------          ---name---------------     ---is_equal------------------     ---trailing comment------
+    #                                                                ---list_size----------                                                      ---value---                   ---comment---
+    PARSER = re.compile(r'^\s*(?P<type>[a-zA-Z0-9/_]+)(?P<is_list>\[(?P<list_size>[0-9]*)\]){0,1}\s*(?P<name>[a-zA-Z0-9/_]+)\s*(?P<is_equal>=\s*(?P<value>.*)){0,1}(\s*#(?P<comment>.*)){0,1}$')
 
     @classmethod
     def parse(klass, text_line):
@@ -59,15 +63,21 @@ class MessageField:
         self._default = ""
         
         if self._is_list:
-            self._is_variable = (match.group("list_size") is None)
+            self._is_variable = not match.group("list_size")
             if not self._is_variable:
                 # This should be an int(value) but throws an error
                 # and I have noidea why
                 self._size = match.group("list_size")
         
+        comment = match.group("comment")
         if self._has_default:
             self._default = match.group("value")
+            if self._type != "string" and "#" in self._default:
+                self._default, comment = self._default.split("#", 1)
+            self._default = self._default.strip()
         self._text = CommentField.empty()
+        if comment is not None:
+            self._text = CommentField.parse(f"#{comment}")
 
     @property
     def is_list(self):
@@ -150,10 +160,11 @@ class MessageField:
     
     def set_text(self, new_text):
         r"""
-        Set a new comment field
+        Set a new comment field. The trailing comment of the definition, if any, is 
+        kept after the lines of the new comment field.
         """
         if isinstance(new_text, CommentField):
-            self._text = new_text
+            self._text = new_text.join(self._text)
 
     @property
     def type_text(self):
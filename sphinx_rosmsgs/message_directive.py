@@ -1,11 +1,30 @@
 from docutils import nodes
+from docutils.parsers.rst import directives
 from sphinx import addnodes
 from sphinx.util.docutils import SphinxDirective
 from sphinx_rosmsgs.message_indexer import MessageIndexer
+from sphinx_rosmsgs import message_search
+from sphinx_rosmsgs.file_parser.message_field import MessageField
+from sphinx_rosmsgs.message_types import resolve_type, package_of
 from docutils.statemachine import ViewList
-from sphinx.util.nodes import nested_parse_with_titles
+from sphinx.util.nodes import nested_parse_with_titles, make_refnode
+from sphinx.util import logging
 import re
 
+logger = logging.getLogger(__name__)
+
+# Lines of a comment that may start a reST construct other than a paragraph, thus need
+# the full nested parse: blank lines (more paragraphs), indentation, bullets, enumerators
+# (arabic, letters, roman, auto, with a period or parentheses), option lists, field
+# lists, explicit markup and anonymous targets, tables, line blocks, doctests, literal
+# blocks, adornments and anything starting with a repeated punctuation character. It is
+# deliberately broader than reST: a false match only costs a nested parse.
+RST_STRUCTURE = re.compile(
+    r'^(\s*$|\s|[-*+\u2022\u2023\u2043](\s|$)|\(?(\d+|[a-zA-Z]|[ivxlcdmIVXLCDM]+|#)[.)](\s|$)|'
+    r'[-+/]\S|:[^:\s][^:]*:(\s|$)|\||>>>|'
+    r'(?P<punctuation>[!-/:-@\[-`{-~])(?P=punctuation)|'
+    r'(?P<adornment>[!-/:-@\[-`{-~])(?P=adornment)*\s*$)|::\s*$')
+
 
 class MessageDirective(SphinxDirective):
     r"""
@@ -14,13 +33,36 @@ class MessageDirective(SphinxDirective):
     
     Only the messages in package added to the ``rosmsg_path_root`` global 
     configuration variable can be documented. Otherwise an error is raised.
+
+    Options:
+
+     * ``:layout:``: ``description`` (default) renders each field as a full description 
+       with its signature, ``table`` renders the fields of a block as rows of a single 
+       table (type, name, default and description), a much smaller document for large
+       messages.
+     * ``:md5sum:``: shows the ROS 1 MD5 sum of the message below the title
+     * ``:wire-size:``: shows the serialized size of the message (of each block)
+       below the title, and if it is fixed-size
+     * ``:embedded:``: ``document`` renders the fields of each distinct embedded type
+       (e.g. ``std_msgs/Header``) once per document, next to its first occurrence, and
+       links the later occurrences to it. ``site`` links each embedded type to the 
+       ``ros_message`` that documents it, anywhere in the site (types that are not 
+       documented are left as plain text)
     """
 
     required_argument = 1
     optional_argument = 0
     has_content = True
+    layouts = ("description", "table")
+    embedded_modes = ("document", "site")
+    option_spec = {
+        "layout": lambda argument: directives.choice(argument, MessageDirective.layouts),
+        "md5sum": directives.flag,
+        "wire-size": directives.flag,
+        "embedded": lambda argument: directives.choice(argument, MessageDirective.embedded_modes),
+    }
 
-    def run_section(self, comment, base_ids):
+    def run_section(self, comment, base_ids, ordinal=0):
         r"""
         Execute a nested parsing on a block comment that will contains probably
         some restructured text stuff. We are using nested parsing with titles
@@ -32,9 +74,14 @@ class MessageDirective(SphinxDirective):
         :param comment: the comment block to parse
         :param ids: the id to be used for the source file name generation 
                         (Sphinx requirements) and section ids (lost in return)
+        :param ordinal: the position of the comment in its scope. Ids only depend on
+                        the message name, the block, the field and this ordinal, so
+                        the same input always produces the same document.
         :return: the children of a section to be added to the document corpus
         """
-        ids = f"{base_ids}.{id(comment)}"
+        if not comment.lines:
+            return []
+        ids = f"{base_ids}.{ordinal}"
         comment_file = f"{ids}.rst"
         rst = ViewList()
         for line_no, line_txt in enumerate(comment.lines):
@@ -44,6 +91,23 @@ class MessageDirective(SphinxDirective):
         nested_parse_with_titles(self.state, rst, section)
         return section.children
 
+    def run_cell(self, comment, base_ids):
+        r"""
+        Parses a comment for a cell of the `table` layout. Most comments are a single
+        paragraph: when no line may start another reST construct (see ``RST_STRUCTURE``),
+        only the inline markup is parsed, as the nested parsing does for a paragraph,
+        at a fraction of the cost. Otherwise the comment goes through meth:`run_section`.
+
+        :param comment: the comment block to parse
+        :param base_ids: the id passed to meth:`run_section`
+        :return: the nodes to be added to the cell
+        """
+        if not comment.lines or any(RST_STRUCTURE.search(line) for line in comment.lines):
+            return self.run_section(comment, base_ids)
+        text = "\n".join(comment.lines).rstrip()
+        inline_nodes, messages = self.state.inline_text(text, self.lineno)
+        return [nodes.paragraph(text, "", *inline_nodes)] + messages
+
     def run_definition(self, definition, base_ids):
         r"""
         Writes down the definition of a field of a message and parses its
@@ -61,7 +125,9 @@ class MessageDirective(SphinxDirective):
         :return: a full `desc` node, to be added to the main document
         """
         ids = f"{base_ids}.{definition.name}"
-        desc_type = addnodes.desc_type(text=definition.type_text)
+        type_node, embedded = self.run_embedded_type(definition)
+        desc_type = addnodes.desc_type()
+        desc_type += type_node if type_node else nodes.Text(definition.type_text)
         desc_name = addnodes.desc_name(text=definition.name)
         desc_annotation = addnodes.desc_annotation(text=definition.default_text)
         desc_signature = addnodes.desc_signature(ids=[ids], fullname=[definition.name])
@@ -72,11 +138,119 @@ class MessageDirective(SphinxDirective):
         section = self.run_section(definition.text, ids)
         desc_content = addnodes.desc_content()
         desc_content += section
+        desc_content += embedded
         desc = addnodes.desc(objtype="attribute")
         desc += desc_signature
         desc += desc_content
         return desc
 
+    def run_table(self, definitions, base_ids, package_name=None):
+        r"""
+        Writes down a list of consecutive definitions as the rows of a single table,
+        with columns for type, name, default and description. The description is parsed
+        with meth:`run_cell`. This is the `table` layout counterpart of 
+        meth:`run_definition`.
+
+        :param definitions: the list of definitions to put in the table
+        :param base_ids: the base id for indexing, each row gets the id of its field, 
+                         as the signature in meth:`run_definition`
+        :param package_name: the package used to resolve the field types (defaults to
+                             the package of the documented message)
+        :return: a list with the `table` node, followed by the renderings of the 
+                 embedded types (see meth:`run_embedded_type`)
+        """
+        embedded = []
+        table = nodes.table(classes=["rosmsg-table"])
+        tgroup = nodes.tgroup(cols=4)
+        for width in (20, 20, 10, 50):
+            tgroup += nodes.colspec(colwidth=width)
+        table += tgroup
+
+        thead_row = nodes.row()
+        for title in ("Type", "Name", "Default", "Description"):
+            thead_row += nodes.entry("", nodes.paragraph(text=title))
+        tgroup += nodes.thead("", thead_row)
+
+        tbody = nodes.tbody()
+        for definition in definitions:
+            ids = f"{base_ids}.{definition.name}"
+            row = nodes.row(ids=[ids])
+            type_node, type_embedded = self.run_embedded_type(definition, package_name)
+            embedded += type_embedded
+            type_node = nodes.paragraph("", "", type_node) if type_node else nodes.paragraph(text=definition.type_text.strip())
+            row += nodes.entry("", type_node, classes=["rosmsg-type"])
+            row += nodes.entry("", nodes.paragraph(text=definition.name), classes=["rosmsg-name"])
+            default = nodes.entry(classes=["rosmsg-default"])
+            if definition.default:
+                default += nodes.paragraph(text=definition.default)
+            row += default
+            description = nodes.entry()
+            description += self.run_cell(definition.text, ids)
+            row += description
+            tbody += row
+        tgroup += tbody
+        return [table] + embedded
+
+    def run_embedded_type(self, definition, package_name=None):
+        r"""
+        Handles the type of a field when the ``:embedded:`` option is active and the
+        type is an indexed message (resolved from `MessageField.type`):
+
+         * ``document``: the first occurrence of the type in the document gets a rendering
+           of the type fields (see meth:`run_embedded`), the type is a link to it. When
+           the type has its own ``ros_message`` in the document, the type is a link to 
+           it and it is not rendered again
+         * ``site``: the type is a cross reference to the ``ros_message`` that documents
+           it, resolved when the whole site has been read (see func:`on_missing_reference`)
+
+        :param definition: the definition with the type
+        :param package_name: the package used to resolve the type (defaults to the 
+                             package of the documented message)
+        :return: the node for the type (None to keep the plain text) and the list of 
+                 renderings to add after the definition
+        :rtype: tuple
+        """
+        mode = self.options.get("embedded")
+        if mode is None:
+            return None, []
+        name = resolve_type(definition.type, package_name or package_of(self.message_name))
+        if name is None or name not in self.indexer.index:
+            return None, []
+        type_text = definition.type_text.strip()
+        if mode == "site":
+            xref = addnodes.pending_xref("", refdomain="", reftype="rosmsg", reftarget=name,
+                                         refdoc=self.env.docname)
+            xref += nodes.Text(type_text)
+            return xref, []
+
+        if name in self.env.temp_data.get("rosmsgs_documented", ()):
+            return nodes.reference("", type_text, internal=True, refid=name), []
+        target_id = "embedded." + name.replace("/", ".")
+        reference = nodes.reference("", type_text, internal=True, refid=target_id)
+        rendered = self.env.temp_data.setdefault("rosmsgs_embedded", set())
+        if name in rendered:
+            return reference, []
+        rendered.add(name)
+        return reference, [self.run_embedded(name, target_id)]
+
+    def run_embedded(self, name, target_id):
+        r"""
+        Renders the fields of an embedded type as a compact table (as the `table` 
+        layout), with a rubric and an id to link to. Embedded types of the embedded 
+        type are handled by meth:`run_embedded_type`, thus rendered only once as well.
+
+        :param name: the name of the embedded message in ROS terms
+        :param target_id: the id of the rendering
+        :return: a container node with the rendering
+        """
+        parsed_message = self.indexer.parse(name)
+        container = nodes.container(ids=[target_id], classes=["rosmsg-embedded"])
+        container += nodes.rubric(text=name)
+        definitions = [field for field in parsed_message.request if isinstance(field, MessageField)]
+        if definitions:
+            container += self.run_table(definitions, target_id, package_of(name))
+        return container
+
     def run_block(self, message_block, base_ids, block_name, request_title=True):
         r"""
         A ROS message, indipendently from its actual representation is seen in this
@@ -105,16 +279,84 @@ class MessageDirective(SphinxDirective):
         section = nodes.section(ids=[ids], classes=[ids], names=[ids])
         if request_title:
             section += nodes.title(text=block_name)
+        table_layout = self.options.get("layout") == "table"
+        definitions = []
+        comment_ordinal = 0
         for block in message_block:
             if block.__class__.__name__ == "CommentField":
-                section += self.run_section(block, ids)
+                if definitions:
+                    section += self.run_table(definitions, ids)
+                    definitions = []
+                section += self.run_section(block, ids, comment_ordinal)
+                comment_ordinal += 1
             if block.__class__.__name__ == "MessageField":
-                section += self.run_definition(block, ids)
+                if table_layout:
+                    definitions.append(block)
+                else:
+                    section += self.run_definition(block, ids)
+        if definitions:
+            section += self.run_table(definitions, ids)
         if request_title:
             return section
         else:
             return section.children
 
+    def run_md5sum(self, name):
+        r"""
+        Writes down the MD5 sum of the message, computed by the indexer. If the sum
+        cannot be computed (e.g. an embedded type is not indexed) a warning is emitted.
+
+        :param name: the name of the message in ROS terms
+        :return: a list with the paragraph containing the MD5 sum (empty on failure)
+        :rtype: list
+        """
+        try:
+            md5sum = self.indexer.md5sum(name)
+        except (KeyError, RuntimeError) as e:
+            logger.warning(f"Cannot compute the MD5 sum of `{name}`: {e}", location=self.get_location())
+            return []
+        paragraph = nodes.paragraph(classes=["rosmsg-md5sum"])
+        paragraph += nodes.Text("MD5 sum: ")
+        paragraph += nodes.literal(text=md5sum)
+        return [paragraph]
+
+    def run_wire_size(self, name, parsed_type):
+        r"""
+        Writes down the serialized size of the message, computed by the indexer. For
+        services and actions the size of each block is reported. If the size cannot be
+        computed (e.g. an embedded type is not indexed) a warning is emitted.
+
+        :param name: the name of the message in ROS terms
+        :param parsed_type: one of `message`, `service` or `action`
+        :return: a list with the paragraph containing the wire size (empty on failure)
+        :rtype: list
+        """
+        try:
+            sizes = self.indexer.wire_size(name)
+        except (KeyError, RuntimeError) as e:
+            logger.warning(f"Cannot compute the wire size of `{name}`: {e}", location=self.get_location())
+            return []
+        paragraph = nodes.paragraph(classes=["rosmsg-wire-size"])
+        paragraph += nodes.Text("Wire size: ")
+        if parsed_type == "message":
+            paragraph += nodes.Text(str(sizes[0]))
+        else:
+            block_names = ["Request", "Response", "Feedback"]
+            paragraph += nodes.Text(", ".join(f"{block_name} {size}" for block_name, size in zip(block_names, sizes)))
+        return [paragraph]
+
+    def note_message_dependency(self, name):
+        r"""
+        Registers the file of a message (or its archive) as a dependency of the 
+        document, so the document is read again when the file changes. The MD5 sum, 
+        the wire size and the embedded renderings also depend on the files of the 
+        embedded types (see meth:`MessageIndexer.dependencies`).
+
+        :param name: the name of the message in ROS terms
+        """
+        message_path = self.indexer.get_path(name)
+        self.env.note_dependency(str(getattr(message_path, "archive", message_path)))
+
     def run(self):
         r"""
         The directive run method
@@ -122,13 +364,24 @@ class MessageDirective(SphinxDirective):
         :return: the section node with the documentation of a single complete message
         """
         name = ("").join(self.content)
+        self.message_name = name
         parsed_message = self.indexer.parse(name)
+        self.note_message_dependency(name)
+        if "md5sum" in self.options or "wire-size" in self.options or self.options.get("embedded") == "document":
+            for dependency in sorted(self.indexer.dependencies(name)):
+                self.note_message_dependency(dependency)
+        document_records = message_search.records(self.env).setdefault(self.env.docname, {})
+        document_records[name] = message_search.search_record(parsed_message)
         
         ids = re.sub("/", ".", name)
         
         section = nodes.section(ids=[name], classes=[name], names=[name])       
         section.document = self.state.document
         section += nodes.title(text=parsed_message.name)
+        if "md5sum" in self.options:
+            section += self.run_md5sum(name)
+        if "wire-size" in self.options:
+            section += self.run_wire_size(name, parsed_message.parsed_type)
 
         request_title = True if parsed_message.parsed_type != "message" else False   
         request = self.run_block(parsed_message.request, ids, "Request", request_title)
@@ -153,3 +406,25 @@ class MessageDirective(SphinxDirective):
         :rtype: MessageIndexer
         """
         return MessageIndexer.retrieve_global()
+
+
+def on_missing_reference(app, env, node, contnode):
+    r"""
+    Resolves the cross references to embedded types created by the ``ros_message`` 
+    directive with ``:embedded: site``: the reference points to the first document 
+    (in alphabetical order) where the type is documented. When the type is not
+    documented anywhere, the plain type text is kept.
+
+    :param app: sphinx application
+    :param env: sphinx environment
+    :param node: the `pending_xref` node
+    :param contnode: the content of the reference
+    :return: the reference node, the plain content or None for other references
+    """
+    if node.get("reftype") != "rosmsg":
+        return None
+    target = node["reftarget"]
+    for docname in sorted(message_search.records(env)):
+        if target in message_search.records(env)[docname]:
+            return make_refnode(app.builder, node["refdoc"], docname, target, contnode)
+    return contnode
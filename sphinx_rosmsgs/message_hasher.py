@@ -0,0 +1,102 @@
+import hashlib
+from sphinx_rosmsgs.file_parser.message_field import MessageField
+from sphinx_rosmsgs.message_types import is_builtin, resolve_type, package_of
+
+
+class MessageHasher:
+    r"""
+    Computes the ROS 1 MD5 sums of the indexed messages, from the parsed
+    class:`MessageField` objects. The MD5 sum of a message depends on the MD5 sums of
+    the embedded messages, thus the computation walks the dependency graph: results
+    are memoized per message, so each message is hashed only once, no matter how many
+    other messages embed it.
+
+    The text that is hashed follows the ROS 1 rules (``genmsg``):
+
+     * constants first, as ``type NAME=value``
+     * then fields, as ``type name`` for builtin types (arrays included, e.g. ``uint8[4]``),
+       and as ``<md5 of the embedded message> name`` for embedded messages (arrays dropped)
+
+    A `service` hashes the concatenation of the request and response texts. An `action`
+    has no MD5 sum in ROS 1 (it is split in generated messages): here it hashes the
+    concatenation of the goal, result and feedback texts.
+
+    :param indexer: the message indexer used to resolve and parse the messages
+    """
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+        self._md5sums = {}
+
+    def md5sum(self, name):
+        r"""
+        The MD5 sum of a message
+
+        :param name: the name of the message in ROS terms
+        :raise KeyError: if the message or one of its dependencies is not indexed
+        :raise RuntimeError: if the message depends (recursively) on itself, or if it
+                             (or a dependency) has a line that cannot be parsed
+        :return: the MD5 sum as a hex string
+        :rtype: str
+        """
+        return self._md5sum(name, ())
+
+    def md5sum_all(self):
+        r"""
+        The MD5 sums of all the indexed messages. The messages that cannot be hashed
+        (e.g. because a dependency is not indexed) map to None.
+
+        :return: a dictionary from message names to MD5 sums
+        :rtype: dict
+        """
+        md5sums = {}
+        for name in self.indexer.index:
+            try:
+                md5sums[name] = self.md5sum(name)
+            except (KeyError, RuntimeError):
+                md5sums[name] = None
+        return md5sums
+
+    def _md5sum(self, name, visiting):
+        md5sum = self._md5sums.get(name)
+        if md5sum is not None:
+            return md5sum
+        if name in visiting:
+            raise RuntimeError(f"Circular dependency: {' -> '.join(visiting + (name,))}")
+        if name not in self.indexer.index:
+            raise KeyError(f"`{name}` is not indexed (required by `{visiting[-1] if visiting else name}`)")
+
+        parsed_message = self.indexer.parse(name)
+        if parsed_message.unparsed:
+            line_number, line = parsed_message.unparsed[0]
+            raise RuntimeError(f"Cannot parse the line {line_number} of `{name}`: `{line.strip()}`")
+        visiting = visiting + (name,)
+        blocks = [parsed_message.request]
+        if parsed_message.parsed_type != "message":
+            blocks += [parsed_message.response, parsed_message.feedback]
+        text = "".join(self._text(block, package_of(name), visiting) for block in blocks)
+        md5sum = hashlib.md5(text.encode()).hexdigest()
+        self._md5sums[name] = md5sum
+        return md5sum
+
+    def _text(self, block, package_name, visiting):
+        constants, fields = [], []
+        for field in block:
+            if not isinstance(field, MessageField):
+                continue
+            if field.has_default:
+                constants.append(f"{field.type} {field.name}={field.default}")
+            elif is_builtin(field.type):
+                fields.append(f"{self._array_type(field)} {field.name}")
+            else:
+                embedded = resolve_type(field.type, package_name)
+                fields.append(f"{self._md5sum(embedded, visiting)} {field.name}")
+        return "\n".join(constants + fields)
+
+    @staticmethod
+    def _array_type(field):
+        if not field.is_list:
+            return field.type
+        if field.is_variable:
+            return f"{field.type}[]"
+        return f"{field.type}[{field.size}]"
@@ -0,0 +1,145 @@
+import sys
+from array import array
+from collections.abc import Mapping
+
+
+class MessageIndex(Mapping):
+    r"""
+    Compact storage for the relationship between a message name and its file and
+    type. The index behaves as a read only mapping between the name of the message
+    in ROS terms and the path of its file.
+
+    Instead of keeping a ``pathlib.Path`` and a type string for each message,
+    the index keeps:
+
+     * a single dictionary between the name and a slot number
+     * a list of interned directories (all the messages in the same directory share it)
+     * two arrays, indexed by slot, with the directory number and the type code (a byte)
+
+    The path is rebuilt on demand from the directory, the name of the message and the
+    extension associated to the type. Slots are never modified once written: adding a
+    message again with the same directory and type keeps its slot (the watcher does it
+    at each modification of the file), replacing or removing a message only touches the
+    name dictionary. This keeps the number of Python objects low, which is also friendly
+    with forked workers, since the pages of the index are not touched by reference 
+    counting.
+
+    The index supports a single writer (the class:`MessageIndexer` serializes its 
+    updates) and any number of concurrent readers, without locks: a slot is written 
+    before its name is published in the dictionary, and iteration runs on a snapshot 
+    of the names.
+
+    :param type_list: the list of type strings, the position is the type code
+    :param extension_list: the list of file extensions, in the same order of the types
+    """
+
+    def __init__(self, type_list, extension_list):
+        self._type_list = list(type_list)
+        self._extension_list = list(extension_list)
+        self._slots = {}
+        self._dirs = []
+        self._dir_ids = {}
+        self._dir_slots = array("I")
+        self._type_slots = array("B")
+
+    def add(self, name, path, msg_type):
+        r"""
+        Add (or replace) a message in the index.
+
+        :param name: the message name in ROS terms
+        :param path: the path of the message file
+        :param msg_type: one of the type in the type list (e.g. `message`)
+        :raise ValueError: if the type is not in the type list
+        """
+        directory = path.parent
+        type_id = self._type_list.index(msg_type)
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(directory)
+            self._dir_ids[directory] = dir_id
+        slot = self._slots.get(name)
+        if slot is not None and self._dir_slots[slot] == dir_id and self._type_slots[slot] == type_id:
+            return
+        self._dir_slots.append(dir_id)
+        self._type_slots.append(type_id)
+        self._slots[sys.intern(name)] = len(self._type_slots) - 1
+
+    def remove(self, name):
+        r"""
+        Remove a message from the index
+
+        :param name: the message name in ROS terms
+        :raise KeyError: if the name does not exists
+        """
+        del self._slots[name]
+
+    def get_path(self, name):
+        r"""
+        Rebuild the path of a message, given its name.
+
+        :param name: the message name in ROS terms
+        :return: the path of the file
+        :rtype: pathlib.Path
+        :raise KeyError: if the name does not exists
+        """
+        slot = self._slots[name]
+        stem = name.rpartition("/")[2]
+        extension = self._extension_list[self._type_slots[slot]]
+        return self._dirs[self._dir_slots[slot]] / f"{stem}{extension}"
+
+    def get_type(self, name):
+        r"""
+        Return the type of a message, given its name.
+
+        :param name: the message name in ROS terms
+        :return: one of the strings in the type list
+        :rtype: str
+        :raise KeyError: if the name does not exists
+        """
+        return self._type_list[self._type_slots[self._slots[name]]]
+
+    @property
+    def types(self):
+        r"""
+        A read only mapping view between message names and type strings
+
+        :return: a mapping between names and types
+        :rtype: collections.abc.Mapping
+        """
+        return MessageTypeView(self)
+
+    def __getitem__(self, name):
+        return self.get_path(name)
+
+    def __contains__(self, name):
+        return name in self._slots
+
+    def __iter__(self):
+        return iter(tuple(self._slots))
+
+    def __len__(self):
+        return len(self._slots)
+
+
+class MessageTypeView(Mapping):
+    r"""
+    Read only view of a class:`MessageIndex`, mapping names to type strings
+
+    :param message_index: the index to wrap
+    """
+
+    def __init__(self, message_index):
+        self._message_index = message_index
+
+    def __getitem__(self, name):
+        return self._message_index.get_type(name)
+
+    def __contains__(self, name):
+        return name in self._message_index
+
+    def __iter__(self):
+        return iter(self._message_index)
+
+    def __len__(self):
+        return len(self._message_index)
@@ -1,7 +1,18 @@
 import re
+import locale
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
-import xml.etree.cElementTree as ElementTree
+import xml.etree.ElementTree as ElementTree
 from sphinx_rosmsgs.file_parser import FileParser
+from sphinx_rosmsgs.file_parser.message_field import MessageField
+from sphinx_rosmsgs.message_types import resolve_type, package_of
+from sphinx_rosmsgs.message_index import MessageIndex
+from sphinx_rosmsgs.package_discovery import PackageDiscovery
+from sphinx_rosmsgs.archive_source import ArchiveSource, ArchivePath
+from sphinx_rosmsgs.message_hasher import MessageHasher
+from sphinx_rosmsgs.message_layout import MessageLayout
 
 
 class MessageIndexer:
@@ -28,8 +39,22 @@ class MessageIndexer:
     and the ``/path/to/package_0/srv/service_message.srv`` file, and the type mapping 
     between ``package_0/service_message`` to `service` string.
 
-    :param path_list: a list of path to the ROS packages to be included in the 
-                      indexer. There should be only one indexer.
+    The paths in the list can also be workspaces, install prefixes or archives 
+    (``.tar.gz``, ``.zip``, ...): all the packages below them are discovered by 
+    class:`PackageDiscovery`. Files in archives are read directly from the archive
+    (see class:`ArchiveSource`), and their paths are class:`ArchivePath` objects.
+
+    The indexer can be shared between threads (threaded builders, prefetch workers, a 
+    doc server...), with a read-mostly design: lookups (meth:`get_path`, meth:`get_type`,
+    iteration) and the parse of an already parsed message never take a lock. Updates 
+    of the index are serialized by a lock, and a message that is not parsed yet is
+    parsed once, even when many threads request it at the same time (the other 
+    threads wait for the result).
+
+    :param path_list: a list of path to the ROS packages (or workspaces) to be included 
+                      in the indexer. There should be only one indexer.
+    :param discovery_cache: the json file where the discovered packages are cached
+                            between builds (optional)
     """
 
     global_name = "__message__indexer__"
@@ -38,19 +63,28 @@ class MessageIndexer:
     action_ext = ".action"
     package_xml = "package.xml"
     message_type_list = ["message", "service", "action"]
+    package_name_cache = {}
     is_init = False
+    _global_lock = threading.Lock()
 
     @classmethod
-    def register_global(klass, path_list):
+    def register_global(klass, path_list, indexer=None):
         r"""
         Register a global indexer to be used by the shping extension. This global indexer is
-        kinda sort of singularity.
+        kinda sort of singularity. Concurrent registrations are serialized, while
+        meth:`retrieve_global` does not wait: it returns the previous indexer until the
+        new one is ready.
 
+        :param path_list: the list of paths for the new indexer
+        :param indexer: an already built indexer to register instead of a new one
         :return: the global MessageIndexer
         :rtype: MessageIndexer
         """
-        globals()[klass.global_name] = klass(path_list)
-        return klass.retrieve_global()
+        with klass._global_lock:
+            if indexer is None:
+                indexer = klass(path_list)
+            globals()[klass.global_name] = indexer
+        return indexer
 
     @classmethod
     def retrieve_global(klass):
@@ -73,11 +107,22 @@ class MessageIndexer:
             klass.is_init = True
             klass.extension_list = [klass.message_ext, klass.service_ext, klass.action_ext]
  
-    def __init__(self, path_list):
+    def __init__(self, path_list, discovery_cache=None):
         self.__class__.init_class()
         self.path_list = path_list
-        self.index = {}
-        self.type_index = {}
+        self.discovery = PackageDiscovery(discovery_cache, extension_list=self.__class__.extension_list)
+        self.index = MessageIndex(self.__class__.message_type_list, self.__class__.extension_list)
+        self.packages = {}
+        self._parse_cache = {}
+        self._content_cache = {}
+        self._content_keys = {}
+        self._content_users = {}
+        self._dedup_stats = {"parsed": 0, "shared": 0}
+        self._hasher = None
+        self._layout = None
+        self._executor = None
+        self._pending = {}
+        self._lock = threading.RLock()
         self.index_all()
 
     def index_all(self):
@@ -85,15 +130,22 @@ class MessageIndexer:
         Index all the entries in the path list to create the maps.
 
         This method is called inside the contructor.
+
+        :raise RuntimeError: if a path does not exists or does not contain packages
         """
-        for path in self.path_list:
-            self._index_path(path)
+        with self._lock:
+            for path in self.discovery.discover_all(self.path_list):
+                self._index_path(path)
 
     def _parse_package_xml(self, path):
         r"""
         Extract current package name from ``package.xml`` ROS file. It raises if
         cannot find or cannot parse the ``package.xml`` file.
 
+        The name is cached by path and modification time of the ``package.xml`` 
+        (see attr:`package_name_cache`), thus a manifest is parsed again only when 
+        it changes on disk.
+
         :param path: path of the package, where we search for ``package.xml``
         :raise RuntimeError: when it cannot find the file or cannot parse it
         :return: a string with the name of the package
@@ -101,17 +153,45 @@ class MessageIndexer:
         package_xml = path / self.__class__.package_xml
         if not package_xml.exists():
             raise RuntimeError(f"The file `{package_xml}` does not exists. Is this a ROS package?")
-        
+
+        cache = self.__class__.package_name_cache
+        cache_key = str(package_xml.resolve())
+        mtime = package_xml.stat().st_mtime_ns
+        cached = cache.get(cache_key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
         package_name = ""
         try:
-            package_tree = ElementTree.parse(package_xml)
-            package_root = package_tree.getroot()
-            package_name = package_root.find("./name").text
+            with package_xml.open("rb") as package_file:
+                package_name = self._read_package_name(package_file)
         except Exception as e:
             err = f"Cannot parse `{package_xml}`: is a valid ROS package xml file? Error: {e}"
             raise RuntimeError(err)
+        cache[cache_key] = (mtime, package_name)
         return package_name
 
+    @staticmethod
+    def _read_package_name(package_file):
+        r"""
+        Incrementally parse a ``package.xml`` stream, stopping at the first ``<name>`` 
+        child of the root element. Dependency lists and export sections that come 
+        after the name are never read.
+
+        :param package_file: a binary stream with the content of the ``package.xml``
+        :raise ValueError: if the root element does not contain a ``<name>`` tag
+        :return: a string with the name of the package
+        """
+        depth = 0
+        for event, element in ElementTree.iterparse(package_file, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and element.tag == "name":
+                return element.text
+        raise ValueError("missing `<name>` tag")
+
     def _index_path(self, path):
         r"""
         Search for all messages in one of the provided path. In this way we have a mapping
@@ -125,20 +205,217 @@ class MessageIndexer:
         :raise RuntimeError: if the file has an invalid name for the message or the 
                              package path does not exists
         """
-        path = Path(path)
+        if not isinstance(path, ArchivePath):
+            path = Path(path)
         if not path.exists():
             raise RuntimeError(f"The path `{path}` does not exists")
 
         package_name = self._parse_package_xml(path)
+        self.packages[path.resolve()] = (package_name, path)
         
         for ext, msg_type in zip(self.__class__.extension_list, 
                                               self.__class__.message_type_list):
             file_list = [path for path in path.glob(f"**/*{ext}")]
             for message in file_list:
-                name_stem = str(message.stem)
-                name_str = f"{package_name}/{name_stem}"
-                self.index[name_str] = message
-                self.type_index[name_str] = msg_type
+                self._index_file(package_name, message, msg_type)
+
+    def _index_file(self, package_name, message, msg_type):
+        r"""
+        Add a single message file to the index, dropping its parsed version if any.
+
+        :param package_name: the name of the package containing the file
+        :param message: the path of the message file
+        :param msg_type: one of `message`, `service` or `action` string
+        :return: the name of the message in ROS terms
+        :rtype: str
+        """
+        name_str = f"{package_name}/{message.stem}"
+        self.index.add(name_str, message, msg_type)
+        self._invalidate(name_str)
+        return name_str
+
+    def _invalidate(self, name):
+        r"""
+        Drop everything computed from a message that changed: its parsed version, the
+        MD5 sums and the layouts (that may depend on it through embedded types). A parse
+        of the message that is still running is not cached when it completes. The parsed
+        content is dropped when no other message uses it.
+
+        :param name: the name of the message in ROS terms
+        """
+        with self._lock:
+            self._parse_cache.pop(name, None)
+            self._pending.pop(name, None)
+            content_key = self._content_keys.pop(name, None)
+            if content_key is not None:
+                self._release_content(content_key)
+            self._hasher = None
+            self._layout = None
+
+    def _use_content(self, name, content_key):
+        r"""
+        Records that a message uses a parsed content of the content cache, releasing 
+        the content it used before, if different. Must be called with the lock held.
+
+        :param name: the name of the message in ROS terms
+        :param content_key: the key of the content in the content cache
+        """
+        previous = self._content_keys.get(name)
+        if previous == content_key:
+            return
+        if previous is not None:
+            self._release_content(previous)
+        self._content_keys[name] = content_key
+        self._content_users[content_key] = self._content_users.get(content_key, 0) + 1
+
+    def _release_content(self, content_key):
+        r"""
+        A message does not use a parsed content anymore: the content is dropped from the
+        content cache when it was the last one. Must be called with the lock held.
+
+        :param content_key: the key of the content in the content cache
+        """
+        users = self._content_users.pop(content_key, 0) - 1
+        if users > 0:
+            self._content_users[content_key] = users
+        else:
+            self._content_cache.pop(content_key, None)
+
+    def _package_root(self, path):
+        r"""
+        Search the indexed package that contains a path
+
+        :param path: an absolute and resolved path
+        :return: the resolved root of the package or None if it is not in any package
+        :rtype: pathlib.Path, NoneType
+        """
+        for parent in path.parents:
+            if parent in self.packages:
+                return parent
+
+    def _package_names(self, package_root):
+        r"""
+        List the indexed messages whose file is inside a package root
+
+        :param package_root: the resolved root of the package
+        :return: the set of the message names in ROS terms
+        :rtype: set
+        """
+        package_name, path = self.packages[package_root]
+        prefix = f"{package_name}/"
+        names = set()
+        for name in self.index:
+            if name.startswith(prefix):
+                message = self.get_path(name).resolve()
+                if package_root in message.parents:
+                    names.add(name)
+        return names
+
+    def _reindex_package(self, package_root):
+        r"""
+        Remove all the messages of a package and index it again. If the ``package.xml``
+        has disappeared, the package is forgotten.
+
+        :param package_root: the resolved root of the package
+        :return: the names that were removed or (re)added
+        :rtype: set
+        """
+        with self._lock:
+            stale = self._package_names(package_root)
+            for name in stale:
+                self.index.remove(name)
+                self._invalidate(name)
+            _, path = self.packages.pop(package_root)
+            if (package_root / self.__class__.package_xml).exists():
+                self._index_path(path)
+                stale |= self._package_names(package_root)
+            return stale
+
+    def _discover_packages(self, package_xml):
+        r"""
+        A ``package.xml`` appeared outside the indexed packages: the configured roots 
+        that contain it are discovered again (see class:`PackageDiscovery`) and the new 
+        packages are indexed. Archives are never discovered again.
+
+        :param package_xml: the resolved path of the new ``package.xml``
+        :raise RuntimeError: if a new ``package.xml`` cannot be parsed
+        :return: the names of the messages of the new packages
+        :rtype: set
+        """
+        stale = set()
+        for root in self.path_list:
+            root = Path(root)
+            if ArchiveSource.is_archive(root) or not root.is_dir():
+                continue
+            root = root.resolve()
+            if root not in package_xml.parents:
+                continue
+            for package in self.discovery.discover(root):
+                if package.resolve() not in self.packages:
+                    self._index_path(package)
+                    stale |= self._package_names(package.resolve())
+        return stale
+
+    def update_tree(self, path):
+        r"""
+        Incremental update of the index after a change of a whole directory (moved away,
+        removed, or changed in ways that were not reported file by file). The indexed
+        packages inside the directory and the package that contains it are reindexed 
+        (forgotten if their ``package.xml`` is gone) and new packages are discovered.
+
+        :param path: the path of the directory that changed
+        :raise RuntimeError: if a ``package.xml`` cannot be parsed
+        :return: the names of the messages that became stale
+        :rtype: set
+        """
+        path = Path(path).resolve()
+        with self._lock:
+            stale = set()
+            for package_root in list(self.packages):
+                if isinstance(package_root, Path) and (package_root == path or path in package_root.parents):
+                    stale |= self._reindex_package(package_root)
+            package_root = self._package_root(path)
+            if package_root is not None:
+                stale |= self._reindex_package(package_root)
+            stale |= self._discover_packages(path / self.__class__.package_xml)
+            return stale
+
+    def update_path(self, path):
+        r"""
+        Incremental update of the index after a change on the filesystem. The path
+        is the file that has been created, deleted or modified: it is checked against
+        the current state of the disk. A ``package.xml`` change causes the reindexing
+        of the whole package, a message file change touches only that message. A new
+        ``package.xml`` below a configured workspace adds the new package. Other paths
+        outside the indexed packages or with unknown extensions are ignored.
+
+        :param path: the path of the file that changed
+        :raise RuntimeError: if a changed ``package.xml`` cannot be parsed
+        :return: the names of the messages that became stale
+        :rtype: set
+        """
+        path = Path(path).resolve()
+        with self._lock:
+            package_root = self._package_root(path)
+            if package_root is None:
+                if path.name == self.__class__.package_xml:
+                    return self._discover_packages(path)
+                return set()
+            if path == package_root / self.__class__.package_xml:
+                return self._reindex_package(package_root)
+            if path.suffix not in self.__class__.extension_list:
+                return set()
+
+            package_name, root = self.packages[package_root]
+            msg_type = self.__class__.message_type_list[self.__class__.extension_list.index(path.suffix)]
+            name_str = f"{package_name}/{path.stem}"
+            if path.exists():
+                return {self._index_file(package_name, root / path.relative_to(package_root), msg_type)}
+            if name_str in self.index and self.get_path(name_str).resolve() == path:
+                self.index.remove(name_str)
+                self._invalidate(name_str)
+                return {name_str}
+            return set()
 
     def get_path(self, msg_name):
         r"""
@@ -146,10 +423,10 @@ class MessageIndexer:
 
         :param msg_name: the message name in ROS terms
         :return: the path of the file
-        :rtype: str
+        :rtype: pathlib.Path
         :raise KeyError: if the name does not exists
         """
-        return self.index[msg_name]
+        return self.index.get_path(msg_name)
 
     def get_type(self, msg_name):
         r"""
@@ -160,22 +437,148 @@ class MessageIndexer:
         :rtype: str
         :raise KeyError: if the name does not exists
         """
-        return self.type_index[msg_name]
+        return self.index.get_type(msg_name)
+
+    @property
+    def type_index(self):
+        r"""
+        Read only mapping between the message names and their types. The types are
+        stored in the compact class:`MessageIndex`, this is only a view on it.
+
+        :return: a mapping between names and one of `message`, `service` or `action`
+        :rtype: collections.abc.Mapping
+        """
+        return self.index.types
 
     def parse(self, name):
         r"""
         Returns a container with the complete parsed message. The container is also 
-        the parser.
+        the parser. Parsed messages are cached, and dropped from the cache when the
+        index is updated.
+
+        Parsing is keyed by the content of the file: byte-identical files (e.g. vendored
+        copies of the same package) are parsed only once, and all the names that map to
+        the same content share the parsed blocks (see meth:`FileParser.share`).
+
+        A cached message is returned without locking. Otherwise the parse is a future
+        shared by all the threads that request the message (prefetched messages already
+        have one): only the first thread parses, the others wait for its result.
 
         :param name: the name of the message in ROS terms
         :return: a file parser object that has already parsed the message
         :rtype: FileParser
         :raise KeyError: if the name does not exists in the index
         """
-        if name in self.index:
-            parser = FileParser(name, self.get_path(name), self.get_type(name))
-            parser.parse()
+        if name not in self.index:
+            return None
+        parser = self._parse_cache.get(name)
+        if parser is not None:
             return parser
+
+        with self._lock:
+            parser = self._parse_cache.get(name)
+            if parser is not None:
+                return parser
+            future = self._pending.get(name)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._pending[name] = future
+        if is_owner:
+            try:
+                future.set_result(self._parse_content(name))
+            except BaseException as e:
+                future.set_exception(e)
+        error = future.exception()
+        with self._lock:
+            if self._pending.get(name) is future:
+                del self._pending[name]
+                if error is None:
+                    self._parse_cache[name] = future.result()
+        return future.result()
+
+    def prefetch(self, names, max_workers=4, max_pending=64):
+        r"""
+        Start parsing messages ahead of time, in a bounded thread pool. A later 
+        meth:`parse` of a prefetched name waits for (or directly gets) the result,
+        that is the same object a direct parse would have returned.
+
+        Names that are not indexed, already parsed or already pending are skipped.
+        At most ``max_pending`` results wait to be retrieved, further names are not
+        prefetched (they are parsed when requested), so memory stays bounded.
+
+        :param names: an iterable of message names in ROS terms
+        :param max_workers: the number of threads of the pool (used at its creation)
+        :param max_pending: the maximum number of prefetched results not yet retrieved
+        :return: the number of messages submitted
+        :rtype: int
+        """
+        submitted = 0
+        with self._lock:
+            for name in names:
+                if len(self._pending) >= max_pending:
+                    break
+                if name not in self.index or name in self._parse_cache or name in self._pending:
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rosmsg-prefetch")
+                self._pending[name] = self._executor.submit(self._parse_content, name)
+                submitted += 1
+        return submitted
+
+    def shutdown_prefetch(self):
+        r"""
+        Stop the prefetch thread pool (if started), waiting for the running parses.
+        Results not yet retrieved are dropped (parses running in other threads are not).
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            for name, pending in list(self._pending.items()):
+                if pending.done():
+                    del self._pending[name]
+
+    def _parse_content(self, name):
+        r"""
+        Parse a message, reusing the parsed content of an identical file if any. The
+        file is decoded with the locale encoding, as ``open`` does.
+
+        :param name: the name of the message in ROS terms
+        :return: a file parser object that has already parsed the message
+        :rtype: FileParser
+        """
+        path, msg_type = self.get_path(name), self.get_type(name)
+        content = path.read_bytes()
+        content_key = (hashlib.sha1(content).digest(), msg_type)
+        shared = self._content_cache.get(content_key)
+        if shared is None:
+            parser = FileParser(name, path, msg_type)
+            parser.parse(content.decode(locale.getpreferredencoding(False)))
+            with self._lock:
+                shared = self._content_cache.setdefault(content_key, parser)
+                self._dedup_stats["parsed" if shared is parser else "shared"] += 1
+                self._use_content(name, content_key)
+            return parser
+        with self._lock:
+            self._dedup_stats["shared"] += 1
+            self._use_content(name, content_key)
+        return shared.share(name, path)
+
+    @property
+    def dedup_stats(self):
+        r"""
+        Statistics of the content-addressed parsing:
+
+         * ``parsed``: the number of files actually parsed
+         * ``shared``: the number of messages that reused an identical parsed file
+         * ``contents``: the number of distinct contents in the cache
+
+        :return: a dictionary with the statistics
+        :rtype: dict
+        """
+        return dict(self._dedup_stats, contents=len(self._content_cache))
     
     def parse_all(self):
         r"""
@@ -189,7 +592,109 @@ class MessageIndexer:
         for name in self.index:
             file_parsers[name] = self.parse(name)
         return file_parsers
+
+    def dependencies(self, name):
+        r"""
+        The messages embedded in a message, recursively: the closure of the types that
+        the MD5 sum, the wire size or the rendering of the embedded types depend on.
+        Types that are not indexed are skipped.
+
+        :param name: the name of the message in ROS terms
+        :return: the set of the names of the embedded messages (not including ``name``)
+        :rtype: set
+        :raise KeyError: if the name does not exists in the index
+        """
+        closure, stack = set(), [name]
+        while stack:
+            current = stack.pop()
+            parsed_message = self.parse(current)
+            for block in (parsed_message.request, parsed_message.response, parsed_message.feedback):
+                for field in block:
+                    if not isinstance(field, MessageField):
+                        continue
+                    embedded = resolve_type(field.type, package_of(current))
+                    if embedded and embedded not in closure and embedded in self.index:
+                        closure.add(embedded)
+                        stack.append(embedded)
+        closure.discard(name)
+        return closure
     
+    @property
+    def hasher(self):
+        r"""
+        The class:`MessageHasher` of the indexer, with the memoized MD5 sums. It is
+        replaced when the index is updated.
+
+        :rtype: MessageHasher
+        """
+        hasher = self._hasher
+        if hasher is None:
+            with self._lock:
+                if self._hasher is None:
+                    self._hasher = MessageHasher(self)
+                hasher = self._hasher
+        return hasher
+
+    def md5sum(self, name):
+        r"""
+        The ROS 1 MD5 sum of a message (see class:`MessageHasher`)
+
+        :param name: the name of the message in ROS terms
+        :raise KeyError: if the message or one of its dependencies is not indexed
+        :raise RuntimeError: if the message depends (recursively) on itself
+        :return: the MD5 sum as a hex string
+        :rtype: str
+        """
+        return self.hasher.md5sum(name)
+
+    def md5sum_all(self):
+        r"""
+        Batch computation of the MD5 sums of the whole index. Messages that cannot be
+        hashed map to None.
+
+        :return: a dictionary from message names to MD5 sums
+        :rtype: dict
+        """
+        return self.hasher.md5sum_all()
+
+    @property
+    def layout(self):
+        r"""
+        The class:`MessageLayout` of the indexer, with the memoized serialized sizes.
+        It is replaced when the index is updated.
+
+        :rtype: MessageLayout
+        """
+        layout = self._layout
+        if layout is None:
+            with self._lock:
+                if self._layout is None:
+                    self._layout = MessageLayout(self)
+                layout = self._layout
+        return layout
+
+    def wire_size(self, name):
+        r"""
+        The serialized size bounds of each block of a message (see class:`MessageLayout`)
+
+        :param name: the name of the message in ROS terms
+        :raise KeyError: if the message or one of its dependencies is not indexed
+        :raise RuntimeError: if the message depends (recursively) on itself
+        :return: a list of class:`WireSize`, one for each block
+        :rtype: list
+        """
+        return self.layout.wire_size(name)
+
+    def wire_size_all(self):
+        r"""
+        Batch analysis of the serialized sizes of the whole index. Messages that cannot
+        be analysed map to None.
+
+        :return: a dictionary from message names to lists of class:`WireSize`
+        :rtype: dict
+        """
+        return self.layout.wire_size_all()
+
     def __str__(self):
         r = ""
         for name in self.index:
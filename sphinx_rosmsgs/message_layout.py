@@ -0,0 +1,139 @@
+from sphinx_rosmsgs.file_parser.message_field import MessageField
+from sphinx_rosmsgs.message_types import PRIMITIVE_SIZES, LENGTH_PREFIX_SIZE, is_builtin, resolve_type, package_of
+
+
+class WireSize:
+    r"""
+    Bounds of the serialized size of a message (or of a part of it), in bytes.
+
+    :param min_size: the minimum serialized size
+    :param max_size: the maximum serialized size, None if unbounded
+    """
+
+    def __init__(self, min_size=0, max_size=0):
+        self.min_size = min_size
+        self.max_size = max_size
+
+    @property
+    def is_fixed(self):
+        r"""
+        If the serialized size is always the same
+
+        :rtype: bool
+        """
+        return self.min_size == self.max_size
+
+    def __add__(self, other):
+        max_size = None
+        if self.max_size is not None and other.max_size is not None:
+            max_size = self.max_size + other.max_size
+        return WireSize(self.min_size + other.min_size, max_size)
+
+    def __mul__(self, count):
+        return WireSize(self.min_size * count, None if self.max_size is None else self.max_size * count)
+
+    def __eq__(self, other):
+        return isinstance(other, WireSize) and (self.min_size, self.max_size) == (other.min_size, other.max_size)
+
+    def __repr__(self):
+        return f"WireSize({self.min_size}, {self.max_size})"
+
+    def __str__(self):
+        if self.is_fixed:
+            return f"{self.min_size} bytes (fixed)"
+        if self.max_size is None:
+            return f"at least {self.min_size} bytes (variable)"
+        return f"{self.min_size} to {self.max_size} bytes (variable)"
+
+
+class MessageLayout:
+    r"""
+    Analyses the serialized (ROS 1 wire format) size of the indexed messages: if a
+    message is fixed-size and the bounds of its size. Strings and variable length
+    arrays have a 4 bytes length prefix and no upper bound, fixed length arrays have
+    no prefix. Constants are not serialized.
+
+    Embedded messages are analysed recursively, and the result is memoized per
+    message, so each message of the type graph is analysed only once.
+
+    :param indexer: the message indexer used to resolve and parse the messages
+    """
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+        self._sizes = {}
+
+    def wire_size(self, name):
+        r"""
+        The serialized size of each block of a message: one for a `message`, request and
+        response for a `service`, goal, result and feedback for an `action`.
+
+        :param name: the name of the message in ROS terms
+        :raise KeyError: if the message or one of its dependencies is not indexed
+        :raise RuntimeError: if the message depends (recursively) on itself, or if it
+                             (or a dependency) has a line that cannot be parsed
+        :return: a list of class:`WireSize`, one for each block
+        :rtype: list
+        """
+        return self._wire_size(name, ())
+
+    def wire_size_all(self):
+        r"""
+        The serialized sizes of all the indexed messages. Messages that cannot be
+        analysed (e.g. because a dependency is not indexed) map to None.
+
+        :return: a dictionary from message names to lists of class:`WireSize`
+        :rtype: dict
+        """
+        sizes = {}
+        for name in self.indexer.index:
+            try:
+                sizes[name] = self.wire_size(name)
+            except (KeyError, RuntimeError):
+                sizes[name] = None
+        return sizes
+
+    def _wire_size(self, name, visiting):
+        sizes = self._sizes.get(name)
+        if sizes is not None:
+            return sizes
+        if name in visiting:
+            raise RuntimeError(f"Circular dependency: {' -> '.join(visiting + (name,))}")
+        if name not in self.indexer.index:
+            raise KeyError(f"`{name}` is not indexed (required by `{visiting[-1] if visiting else name}`)")
+
+        parsed_message = self.indexer.parse(name)
+        if parsed_message.unparsed:
+            line_number, line = parsed_message.unparsed[0]
+            raise RuntimeError(f"Cannot parse the line {line_number} of `{name}`: `{line.strip()}`")
+        visiting = visiting + (name,)
+        blocks = [parsed_message.request]
+        if parsed_message.parsed_type != "message":
+            blocks += [parsed_message.response]
+        if parsed_message.parsed_type == "action":
+            blocks += [parsed_message.feedback]
+        sizes = [self._block_size(block, package_of(name), visiting) for block in blocks]
+        self._sizes[name] = sizes
+        return sizes
+
+    def _block_size(self, block, package_name, visiting):
+        size = WireSize()
+        for field in block:
+            if isinstance(field, MessageField) and not field.has_default:
+                size = size + self._field_size(field, package_name, visiting)
+        return size
+
+    def _field_size(self, field, package_name, visiting):
+        if is_builtin(field.type):
+            element_size = PRIMITIVE_SIZES[field.type]
+            if element_size is None:
+                element = WireSize(LENGTH_PREFIX_SIZE, None)
+            else:
+                element = WireSize(element_size, element_size)
+        else:
+            element = self._wire_size(resolve_type(field.type, package_name), visiting)[0]
+        if not field.is_list:
+            return element
+        if field.is_variable:
+            return WireSize(LENGTH_PREFIX_SIZE, None if element.max_size != 0 else LENGTH_PREFIX_SIZE)
+        return element * int(field.size)
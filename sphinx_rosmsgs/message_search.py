@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+from sphinx_rosmsgs.file_parser.comment_field import CommentField
+from sphinx_rosmsgs.file_parser.message_field import MessageField
+
+
+SEARCH_INDEX = "rosmsgs_searchindex.json"
+SEARCH_SCRIPT = "rosmsgs_search.js"
+STATIC_PATH = os.path.join(os.path.dirname(__file__), "static")
+KINDS = ["message", "service", "action"]
+
+
+def first_line(comment):
+    r"""
+    The first line of a comment with some text, without the ``#`` and the spaces 
+    of decorations like ``## Fields ##``
+
+    :param comment: the comment field
+    :return: the line, empty if the comment has no text
+    :rtype: str
+    """
+    for line in comment.lines:
+        line = line.strip("# \t")
+        if line:
+            return line
+    return ""
+
+
+def search_record(parsed_message):
+    r"""
+    Creates the search record of a documented message. Records are stored in the
+    sphinx environment by the directive (see func:`records`), so they are pickled 
+    with it and only the documents that are read again update them.
+
+    :param parsed_message: the parsed message
+    :return: a dictionary with the kind, the first comment line (of the header, or of
+             the description of the first field) and the fields (name and type) of 
+             the message
+    :rtype: dict
+    """
+    summary = ""
+    for field in parsed_message.request.header:
+        if isinstance(field, CommentField):
+            summary = first_line(field)
+            if summary:
+                break
+    else:
+        # Without a header, the comment above the first field is attached to the field
+        for field in parsed_message.request:
+            if isinstance(field, MessageField):
+                summary = first_line(field.text)
+                break
+    fields = []
+    for block in (parsed_message.request, parsed_message.response, parsed_message.feedback):
+        for field in block:
+            if isinstance(field, MessageField):
+                fields.append((field.name, field.type_text.strip()))
+    return {
+        "kind": parsed_message.parsed_type,
+        "summary": summary,
+        "fields": fields,
+    }
+
+
+def compact_index(records, get_target_uri):
+    r"""
+    Builds the compact search index from the records. Document uris, kinds and
+    field types are stored once and referenced by position::
+
+        {
+          "kinds": ["message", ...],
+          "docs": ["path/to/page.html", ...],
+          "types": ["float64", ...],
+          "messages": [[name, kind, doc, summary, [[field, type], ...]], ...]
+        }
+
+    The anchor of a message in its document is the message name.
+
+    A message documented in more than one document points to the first document,
+    in alphabetical order.
+
+    :param records: a dictionary from docnames to the search records of the document
+    :param get_target_uri: the builder function that converts a docname in an uri
+    :return: the search index
+    :rtype: dict
+    """
+    first = {}
+    for docname in sorted(records):
+        for name, record in records[docname].items():
+            first.setdefault(name, (docname, record))
+    docs, types = {}, {}
+    messages = []
+    for name in sorted(first):
+        docname, record = first[name]
+        doc = docs.setdefault(get_target_uri(docname), len(docs))
+        fields = [[field, types.setdefault(field_type, len(types))] for field, field_type in record["fields"]]
+        messages.append([name, KINDS.index(record["kind"]), doc, record["summary"], fields])
+    return {"kinds": KINDS, "docs": list(docs), "types": list(types), "messages": messages}
+
+
+def records(env):
+    r"""
+    The search records stored in the sphinx environment
+
+    :param env: the sphinx environment
+    :return: a dictionary from docnames to dictionaries from message names to records
+    :rtype: dict
+    """
+    if not hasattr(env, "rosmsgs_search"):
+        env.rosmsgs_search = {}
+    return env.rosmsgs_search
+
+
+def on_env_purge_doc(app, env, docname):
+    r"""
+    Drops the records of a document that is going to be read again (or was removed)
+    """
+    records(env).pop(docname, None)
+
+
+def on_env_merge_info(app, env, docnames, other):
+    r"""
+    Merges the records collected by a parallel reader process
+    """
+    for docname in docnames:
+        if docname in records(other):
+            records(env)[docname] = records(other)[docname]
+
+
+def on_builder_inited(app):
+    r"""
+    Adds the search script to the html pages, when ``rosmsg_search_index`` is enabled.
+    The script itself is copied at the end of the build (see func:`on_build_finished`),
+    so the configuration is not touched and incremental builds are not invalidated.
+    """
+    if not app.config["rosmsg_search_index"] or app.builder.format != "html":
+        return
+    app.add_js_file(SEARCH_SCRIPT, loading_method="defer")
+
+
+def on_build_finished(app, exception):
+    r"""
+    Writes the compact search index and copies the search script in the ``_static``
+    output folder, once, at the end of the build, when ``rosmsg_search_index`` is 
+    enabled. The index is built from the records in the environment and the file is
+    written only if its content changed.
+    """
+    if exception or not app.config["rosmsg_search_index"] or app.builder.format != "html":
+        return
+    static_dir = os.path.join(app.outdir, "_static")
+    os.makedirs(static_dir, exist_ok=True)
+    shutil.copyfile(os.path.join(STATIC_PATH, SEARCH_SCRIPT), os.path.join(static_dir, SEARCH_SCRIPT))
+    index = compact_index(records(app.env), app.builder.get_target_uri)
+    content = json.dumps(index, separators=(",", ":"), ensure_ascii=False)
+    index_path = os.path.join(static_dir, SEARCH_INDEX)
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as index_file:
+            if index_file.read() == content:
+                return
+    with open(index_path, "w", encoding="utf-8") as index_file:
+        index_file.write(content)
@@ -0,0 +1,68 @@
+r"""
+Helpers for the types of the fields of a ROS message (the ``type`` of a
+class:`MessageField`): which ones are builtin and how to resolve the others to
+the name of a message in ROS terms, as used by the class:`MessageIndexer`.
+"""
+
+BUILTIN_TYPES = frozenset([
+    "bool", "byte", "char",
+    "int8", "uint8", "int16", "uint16", "int32", "uint32", "int64", "uint64",
+    "float32", "float64", "string", "wstring", "time", "duration",
+])
+
+# Serialized size in bytes of the builtin types, None for variable size types
+PRIMITIVE_SIZES = {
+    "bool": 1, "byte": 1, "char": 1, "int8": 1, "uint8": 1,
+    "int16": 2, "uint16": 2, "int32": 4, "uint32": 4, "float32": 4,
+    "int64": 8, "uint64": 8, "float64": 8, "time": 8, "duration": 8,
+    "string": None, "wstring": None,
+}
+
+# Serialized size in bytes of the length prefix of strings and variable arrays
+LENGTH_PREFIX_SIZE = 4
+
+HEADER_TYPE = "Header"
+HEADER_MESSAGE = "std_msgs/Header"
+
+
+def is_builtin(field_type):
+    r"""
+    Check if a field type is a builtin type (not an embedded message)
+
+    :param field_type: the base type of the field (not including list)
+    :return: true if the type is builtin
+    :rtype: bool
+    """
+    return field_type in BUILTIN_TYPES
+
+
+def resolve_type(field_type, package_name):
+    r"""
+    Resolve the type of a field to the name of a message in ROS terms. Unqualified
+    types belong to the package of the message that contains the field, ``Header``
+    is ``std_msgs/Header`` and the ROS 2 form ``pkg/msg/Type`` becomes ``pkg/Type``.
+
+    :param field_type: the base type of the field (not including list)
+    :param package_name: the package of the message containing the field
+    :return: the name of the embedded message, None for builtin types
+    :rtype: str, NoneType
+    """
+    if is_builtin(field_type):
+        return None
+    parts = field_type.split("/")
+    if len(parts) == 1:
+        if field_type == HEADER_TYPE:
+            return HEADER_MESSAGE
+        return f"{package_name}/{field_type}"
+    return f"{parts[0]}/{parts[-1]}"
+
+
+def package_of(message_name):
+    r"""
+    The package of a message name in ROS terms
+
+    :param message_name: the message name in ROS terms
+    :return: the name of the package
+    :rtype: str
+    """
+    return message_name.partition("/")[0]
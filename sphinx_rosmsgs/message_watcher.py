@@ -0,0 +1,345 @@
+import os
+import struct
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+from sphinx_rosmsgs.message_indexer import MessageIndexer
+from sphinx_rosmsgs.package_discovery import PackageDiscovery
+from sphinx_rosmsgs.archive_source import ArchiveSource
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+
+def walk(root):
+    r"""
+    Walk of a watched directory, pruned as the walk of class:`PackageDiscovery`: hidden
+    directories and directories marked with an ignore file are skipped.
+
+    :param root: the directory to walk
+    :return: a generator of ``(directory, file names)`` tuples
+    """
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [d for d in dir_names if not d.startswith(".") and not any(
+            os.path.exists(os.path.join(dir_path, d, marker)) for marker in PackageDiscovery.ignore_markers)]
+        yield dir_path, file_names
+
+
+class StatPoller:
+    r"""
+    Filesystem change detector based on ``stat``. Each call to meth:`events` walks
+    the watched directories and compares the modification times of the interesting
+    files with the previous walk.
+
+    :param roots: list of resolved directories to watch
+    :param is_watched: predicate on a file name, true for the files to report
+    """
+
+    def __init__(self, roots, is_watched):
+        self._roots = list(roots)
+        self._is_watched = is_watched
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for root in self._roots:
+            for dir_path, file_names in walk(root):
+                for file_name in file_names:
+                    if not self._is_watched(file_name):
+                        continue
+                    file_path = os.path.join(dir_path, file_name)
+                    try:
+                        snapshot[file_path] = os.stat(file_path).st_mtime_ns
+                    except OSError:
+                        pass
+        return snapshot
+
+    def add_root(self, root):
+        r"""
+        Start watching a new directory. The files already there are not reported.
+
+        :param root: resolved directory to watch
+        """
+        self._roots.append(root)
+        self._snapshot = self._scan()
+
+    def events(self):
+        r"""
+        Returns the files created, deleted or modified since the previous call. A walk
+        sees every file, so no directory needs a rescan.
+
+        :return: a set of paths of files and an (empty) set of paths of directories
+        :rtype: tuple
+        """
+        snapshot = self._scan()
+        changed = {path for path, mtime in snapshot.items() if self._snapshot.get(path) != mtime}
+        changed |= self._snapshot.keys() - snapshot.keys()
+        self._snapshot = snapshot
+        return changed, set()
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    r"""
+    Filesystem change detector based on Linux ``inotify``, through ``ctypes``. A watch
+    is added for each directory below the roots; new directories are watched as soon
+    as their creation is reported. Renames are seen as a deletion of the old path and
+    a creation of the new one.
+
+    Some changes are not reported file by file, and the directories involved must be 
+    rescanned: a directory moved away (its files are not reported as deleted) and a 
+    queue overflow (events were lost, all the roots are rescanned).
+
+    :param roots: list of resolved directories to watch
+    :param is_watched: predicate on a file name, true for the files to report
+    :raise OSError: if inotify is not available
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, roots, is_watched):
+        library = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Cannot initialize inotify")
+        self._is_watched = is_watched
+        self._roots = list(roots)
+        self._watches = {}
+        for root in roots:
+            self.add_root(root)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+    def _remove_watches(self, directory):
+        prefix = os.path.join(directory, "")
+        for wd, watched in list(self._watches.items()):
+            if watched == directory or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def add_root(self, root):
+        r"""
+        Start watching a new directory (and all its subdirectories)
+
+        :param root: resolved directory to watch
+        :return: the watched files that are already in the directory
+        :rtype: set
+        """
+        existing = set()
+        for dir_path, file_names in walk(root):
+            self._add_watch(dir_path)
+            existing |= {os.path.join(dir_path, f) for f in file_names if self._is_watched(f)}
+        return existing
+
+    def events(self):
+        r"""
+        Returns the files created, deleted or modified since the previous call, and the
+        directories to rescan.
+
+        :return: a set of paths of files and a set of paths of directories
+        :rtype: tuple
+        """
+        changed, rescan = set(), set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = self.EVENT.unpack_from(buffer, offset)
+                offset += self.EVENT.size
+                file_name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    for root in self._roots:
+                        self.add_root(root)
+                    rescan |= {str(root) for root in self._roots}
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or not file_name:
+                    continue
+                file_path = os.path.join(directory, file_name)
+                if mask & self.IN_ISDIR:
+                    if mask & self.IN_MOVED_FROM:
+                        self._remove_watches(file_path)
+                        rescan.add(file_path)
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not file_name.startswith("."):
+                        changed |= self.add_root(file_path)
+                    continue
+                if self._is_watched(file_name):
+                    changed.add(file_path)
+        return changed, rescan
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class MessageWatcher:
+    r"""
+    Keeps a class:`MessageIndexer` (and its parse cache) warm in a long running
+    process. Changes to the ``.msg``, ``.srv``, ``.action`` and ``package.xml`` files of
+    the indexed packages are applied to the indexer as incremental updates, using
+    ``inotify`` where available and falling back to ``stat`` polling.
+
+    The configured roots of the indexer are watched (not only the packages found in 
+    them), so packages created below a workspace are indexed too. Packages read from
+    archives are not watched.
+
+    The changes are applied when meth:`poll` is called: either directly (for example
+    at the beginning of a new build) or from a background thread started with
+    meth:`start`. A change that cannot be applied (e.g. a half-saved ``package.xml``)
+    stays pending and is applied again by the next poll.
+
+    There exists a global watcher, used by the sphinx extension when the
+    ``rosmsg_watch`` configuration is enabled.
+
+    :param indexer: the message indexer to keep updated
+    :param use_inotify: force (``True``) or disable (``False``) inotify. By default
+                        inotify is used if available.
+    """
+
+    global_name = "__message__watcher__"
+
+    @classmethod
+    def register_global(klass, indexer, use_inotify=None):
+        r"""
+        Register a global watcher for an indexer, closing the previous one.
+
+        :param indexer: the message indexer to keep updated
+        :param use_inotify: see class:`MessageWatcher`
+        :return: the global MessageWatcher
+        :rtype: MessageWatcher
+        """
+        previous = klass.retrieve_global()
+        if previous is not None:
+            previous.close()
+        globals()[klass.global_name] = klass(indexer, use_inotify)
+        return klass.retrieve_global()
+
+    @classmethod
+    def retrieve_global(klass):
+        r"""
+        Retrieve the global class::`MessageWatcher`.
+
+        :return: the global message watcher, or None if it was never registered
+        :rtype: MessageWatcher, NoneType
+        """
+        return globals().get(klass.global_name)
+
+    def __init__(self, indexer, use_inotify=None):
+        self.indexer = indexer
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._pending_rescan = set()
+        self._stale = set()
+        roots = [Path(root).resolve() for root in indexer.path_list
+                 if Path(root).is_dir() and not ArchiveSource.is_archive(root)]
+        self.backend = None
+        if use_inotify is not False:
+            try:
+                self.backend = InotifyWatcher(roots, self._is_watched)
+            except (OSError, AttributeError, TypeError):
+                if use_inotify:
+                    raise
+        if self.backend is None:
+            self.backend = StatPoller(roots, self._is_watched)
+
+    @staticmethod
+    def _is_watched(file_name):
+        return (file_name == MessageIndexer.package_xml or
+                os.path.splitext(file_name)[1] in MessageIndexer.extension_list)
+
+    def poll(self):
+        r"""
+        Apply all the pending filesystem changes to the indexer. Each changed path is
+        applied on its own: the paths that fail stay pending for the next poll, and the
+        messages made stale by the other paths are returned by the next successful poll.
+
+        :raise RuntimeError: if some changes cannot be applied (e.g. a changed 
+                             ``package.xml`` cannot be parsed)
+        :return: the names of the messages that became stale (added, removed or modified)
+        :rtype: set
+        """
+        with self._lock:
+            changed, rescan = self.backend.events()
+            self._pending |= changed
+            self._pending_rescan |= rescan
+            errors = []
+            for pending, update in ((self._pending_rescan, self.indexer.update_tree),
+                                    (self._pending, self.indexer.update_path)):
+                for path in sorted(pending):
+                    try:
+                        self._stale |= update(path)
+                    except Exception as error:
+                        errors.append(f"`{path}`: {error}")
+                    else:
+                        pending.discard(path)
+            if errors:
+                raise RuntimeError(f"Cannot apply some filesystem changes, retrying at the next poll: "
+                                   f"{'; '.join(errors)}")
+            stale, self._stale = self._stale, set()
+            return stale
+
+    def start(self, callback=None, interval=1.0):
+        r"""
+        Start a background thread that polls for changes. The errors of a poll are 
+        logged, the thread keeps polling.
+
+        :param callback: called with the set of stale names, when not empty
+        :param interval: seconds between two polls
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    stale = self.poll()
+                    if stale and callback:
+                        callback(stale)
+                except Exception as error:
+                    logger.warning(f"[rosmsgs] {error}")
+
+        self._thread = threading.Thread(target=loop, name="rosmsg-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        r"""
+        Stop the background thread, if running
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        r"""
+        Stop the watcher and release the resources of the backend
+        """
+        self.stop()
+        self.backend.close()
@@ -0,0 +1,138 @@
+import os
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from sphinx_rosmsgs.archive_source import ArchiveSource
+
+
+class PackageDiscovery:
+    r"""
+    Discovers the ROS packages below a list of roots. A root can be:
+
+     * a package, i.e. a directory with a ``package.xml``
+     * a workspace (e.g. ``~/ros_ws`` or ``~/ros_ws/src``), with packages at any depth
+     * an install prefix (e.g. an ``AMENT_PREFIX_PATH`` entry), with packages in ``share/<pkg>``
+     * an archive (``.tar.gz``, ``.zip``, ``.whl``, ...), with packages at any depth
+
+    The walk is pruned: it never descends into a package, into hidden directories or
+    into directories marked with ``AMENT_IGNORE``, ``CATKIN_IGNORE`` or ``COLCON_IGNORE``
+    (as colcon does for ``build``, ``install`` and ``log``). Roots are walked in parallel.
+
+    The result of each root is cached together with the modification times of all the
+    directories walked. A root is walked again only when one of those directories
+    changed, i.e. an entry was added or removed. The cache lives in the class, thus it
+    is shared by all the indexer in the same process, and can be saved in a json file
+    to be reused by the next build.
+
+    :param cache_file: the path of the json file for the cache, or None to keep the cache
+                       only in memory
+    :param max_workers: number of threads walking the roots
+    :param extension_list: the extensions of the interface files, read from archives
+    """
+
+    ignore_markers = ("AMENT_IGNORE", "CATKIN_IGNORE", "COLCON_IGNORE")
+    package_xml = "package.xml"
+    cache = {}
+
+    def __init__(self, cache_file=None, max_workers=4, extension_list=(".msg", ".srv", ".action")):
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self.extension_list = extension_list
+        self._load_cache()
+
+    def _load_cache(self):
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as cache_file:
+                stored = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        for root, entry in stored.items():
+            self.__class__.cache.setdefault(root, entry)
+
+    def _save_cache(self, roots):
+        if self.cache_file is None:
+            return
+        cache = self.__class__.cache
+        stored = {root: cache[root] for root in roots if root in cache}
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        with open(self.cache_file, "w") as cache_file:
+            json.dump(stored, cache_file)
+
+    @staticmethod
+    def _is_valid(entry):
+        for directory, mtime in entry["dirs"].items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _walk(self, root):
+        r"""
+        Pruned walk of a root, searching for packages
+
+        :param root: the resolved root, as a string
+        :return: a cache entry, with the packages found and the directories walked
+        :rtype: dict
+        """
+        packages, dirs = [], {}
+        share = os.path.join(root, "share")
+        top = share if os.path.isdir(share) else root
+        for dir_path, dir_names, file_names in os.walk(top):
+            dirs[dir_path] = os.stat(dir_path).st_mtime_ns
+            if self.package_xml in file_names:
+                packages.append(dir_path)
+                dir_names.clear()
+                continue
+            dir_names[:] = [d for d in dir_names if not d.startswith(".") and not any(
+                os.path.exists(os.path.join(dir_path, d, marker)) for marker in self.ignore_markers)]
+        if top != root:
+            dirs[root] = os.stat(root).st_mtime_ns
+        return {"packages": sorted(packages), "dirs": dirs}
+
+    def discover(self, root):
+        r"""
+        Return the packages below a root, from the cache if it is still valid.
+        A root that is a package is returned as is. The packages of an archive are
+        class:`ArchivePath` objects (cached by class:`ArchiveSource`).
+
+        :param root: the path of a package, workspace or install prefix
+        :raise RuntimeError: if the root does not exists or contains no package
+        :return: the list of the package directories
+        :rtype: list
+        """
+        path = Path(root)
+        if not path.exists():
+            raise RuntimeError(f"The path `{path}` does not exists")
+        if ArchiveSource.is_archive(path):
+            packages = ArchiveSource.open(path, self.extension_list).packages()
+            if not packages:
+                raise RuntimeError(f"No `{self.package_xml}` found in the archive `{path}`")
+            return packages
+        if (path / self.package_xml).exists():
+            return [path]
+        key = str(path.resolve())
+        entry = self.__class__.cache.get(key)
+        if entry is None or not self._is_valid(entry):
+            entry = self._walk(key)
+            self.__class__.cache[key] = entry
+        if not entry["packages"]:
+            raise RuntimeError(f"No `{self.package_xml}` found below `{path}`. Is this a ROS package or workspace?")
+        return [Path(package) for package in entry["packages"]]
+
+    def discover_all(self, roots):
+        r"""
+        Return the packages below all the roots, walking them in parallel.
+
+        :param roots: list of paths of packages, workspaces or install prefixes
+        :raise RuntimeError: if a root does not exists or contains no package
+        :return: the list of the package directories, in the order of the roots
+        :rtype: list
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.discover, roots))
+        self._save_cache([str(Path(root).resolve()) for root in roots])
+        return [package for packages in results for package in packages]
@@ -0,0 +1,104 @@
+/*
+ * Search of the documented ROS messages, on the compact index written by
+ * sphinx_rosmsgs (rosmsgs_searchindex.json, next to this script).
+ *
+ * The index is loaded lazily, at the first query. Usage:
+ *
+ *   RosMsgSearch.query("pose header").then(results => ...)
+ *
+ * or, without any code, an input with a `data-rosmsg-search` attribute
+ * whose value is the id of the list that will contain the results:
+ *
+ *   <input data-rosmsg-search="rosmsg-results"><ul id="rosmsg-results"></ul>
+ */
+(function () {
+  "use strict";
+
+  var script = document.currentScript;
+  var indexUrl = new URL("rosmsgs_searchindex.json", script ? script.src : document.baseURI);
+  var rootUrl = new URL("..", indexUrl);
+  var loading = null;
+
+  function load() {
+    if (!loading) {
+      loading = fetch(indexUrl).then(function (response) { return response.json(); })
+        .then(function (index) {
+          index.entries = index.messages.map(function (message) {
+            var fields = message[4].map(function (field) {
+              return [field[0].toLowerCase(), index.types[field[1]].toLowerCase()];
+            });
+            return { message: message, name: message[0].toLowerCase(), fields: fields };
+          });
+          return index;
+        });
+    }
+    return loading;
+  }
+
+  function score(entry, term) {
+    var stem = entry.name.slice(entry.name.indexOf("/") + 1);
+    if (entry.name === term || stem === term) return 100;
+    if (stem.indexOf(term) === 0 || entry.name.indexOf(term) === 0) return 50;
+    if (entry.name.indexOf(term) >= 0) return 20;
+    for (var i = 0; i < entry.fields.length; i++) {
+      if (entry.fields[i][0] === term || entry.fields[i][1] === term) return 10;
+    }
+    for (var j = 0; j < entry.fields.length; j++) {
+      if (entry.fields[j][0].indexOf(term) >= 0 || entry.fields[j][1].indexOf(term) >= 0) return 5;
+    }
+    return 0;
+  }
+
+  function query(text, limit) {
+    var terms = text.toLowerCase().split(/\s+/).filter(Boolean);
+    limit = limit || 50;
+    return load().then(function (index) {
+      if (!terms.length) return [];
+      var results = [];
+      index.entries.forEach(function (entry) {
+        var total = 0;
+        for (var i = 0; i < terms.length; i++) {
+          var value = score(entry, terms[i]);
+          if (!value) return;
+          total += value;
+        }
+        var message = entry.message;
+        results.push({
+          name: message[0],
+          kind: index.kinds[message[1]],
+          url: new URL(index.docs[message[2]] + "#" + message[0], rootUrl).href,
+          summary: message[3],
+          score: total
+        });
+      });
+      results.sort(function (a, b) { return b.score - a.score || (a.name < b.name ? -1 : 1); });
+      return results.slice(0, limit);
+    });
+  }
+
+  function bind(input) {
+    var list = document.getElementById(input.getAttribute("data-rosmsg-search"));
+    if (!list) return;
+    input.addEventListener("input", function () {
+      var text = input.value;
+      query(text).then(function (results) {
+        if (input.value !== text) return;
+        list.textContent = "";
+        results.forEach(function (result) {
+          var item = document.createElement("li");
+          var link = document.createElement("a");
+          link.href = result.url;
+          link.textContent = result.name;
+          item.appendChild(link);
+          item.appendChild(document.createTextNode(" (" + result.kind + ") " + result.summary));
+          list.appendChild(item);
+        });
+      });
+    });
+  }
+
+  window.RosMsgSearch = { query: query, load: load };
+  document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("[data-rosmsg-search]").forEach(bind);
+  });
+})();